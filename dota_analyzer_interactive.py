@@ -1,10 +1,38 @@
 import requests
 import time
-import pandas as pd
+import threading
+import argparse
+import csv
+import json
+import multiprocessing
+import re
+import sqlite3
+import sys
+import zlib
+import numpy as np
 import os
-import matplotlib.pyplot as plt
-import seaborn as sns
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
 import statistics
+import socket
+from collections import deque
+from contextlib import closing, contextmanager
+
+# pandas / matplotlib / seaborn 体积较大，仅在需要生成报告或图表时才在函数内部导入
+
+# 可选依赖：ijson (流式解析比赛 JSON) / orjson (更快的 JSON 解码)；未安装时回退到标准库 json
+try:
+    import ijson
+except ImportError:
+    ijson = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # ==============================================================================
 # 全局常量和配置
@@ -18,43 +46,686 @@ RANK_TIERS = {
     64: "万古 IV", 65: "万古 V", 71: "超凡 I", 72: "超凡 II", 73: "超凡 III", 74: "超凡 IV", 75: "超凡 V", 80: "冠绝"
 }
 LANE_ROLES = {1: "优势路", 2: "中路", 3: "劣势路", 4: "游走"}
+PERSONAL_MODE_COLUMNS = {"Player_ID": "My_Account_ID", "Analyzed_Match_ID": "Match_ID"}
+
+# 运行检查点配置：结果逐行写入 runs/<任务>/rows.jsonl，中断后可用 --resume 继续
+RUNS_DIRECTORY = "runs"
+CHECKPOINT_CHUNK_ROWS = 5000
+MANIFEST_FLUSH_ROWS = 50
+
+# 增量刷新配置 (仅个人战绩模式)：按页向前翻阅比赛列表，直到遇到上次记录的最新比赛 (高水位)
+REFRESH_PAGE_SIZE = 20
+REFRESH_MAX_NEW_MATCHES = 200  # 单次刷新最多处理的新比赛数；超出时先处理较早的比赛，其余留到下次刷新
+
+# 抽样爬虫配置 (模式1)：从自己的比赛出发，沿“玩家-比赛”关系广度优先扩展样本，直到达到目标样本数
+CRAWL_MAX_FRONTIER = 10000  # 待访问玩家队列的上限，超出后不再加入新玩家
+CRAWL_BATCH_PLAYERS = 50  # 每轮并发访问的玩家数
+CRAWL_PLAYER_MATCH_LOOKBACK = 5  # 每名玩家查看的最近比赛数，取第一场未见过的比赛作为样本
+RANK_BRACKETS = {1: "先锋", 2: "卫士", 3: "中军", 4: "统帅", 5: "传奇", 6: "万古", 7: "超凡", 8: "冠绝"}
+
+# 共享任务队列配置：多个 worker 进程/机器从同一个 SQLite 队列租用任务，租约过期后任务会被重新分配
+QUEUE_LEASE_SECONDS = 300
+QUEUE_LEASE_BATCH = 20  # 每次租用的比赛数
+QUEUE_IDLE_POLL_SECONDS = 10
+MATCH_RECORD_PLAYER_FIELDS = ('account_id', 'isRadiant', 'hero_id', 'rank_tier', 'lane_role')
+
+# 图表输出配置：PLOT_WORKERS 为 None 时按 CPU 数自动选择渲染进程数，为 1 时在当前进程内逐个渲染
+PLOT_WORKERS = None
+PLOT_FORMAT = "png"  # "png" 或 "svg"
+DEFAULT_SWEEP_THRESHOLDS = [1000, 2000, 3000, 4000, 5000, 6000, 8000, 10000, 12000, 15000, 20000]
+SWEEP_CHUNK_ROWS = 4096
 OUTPUT_PLOT_DIRECTORY = f"plots//dota_analysis_report_{time.strftime('%Y%m%d_%H%M')}"
 
-# 智能重试配置
-RETRY_ATTEMPTS = 2
-RETRY_DELAY_SECONDS = 5
+# 分组统计与置信区间配置："wilson" Wilson 区间 (默认，闭式解) / "bootstrap" 百分位自助法 (全胜/全负的分组改用 Wilson)
+CI_METHOD = "wilson"
+CONFIDENCE_LEVEL = 0.95
+BOOTSTRAP_SAMPLES = 2000
+BOOTSTRAP_SEED = 0
+RANK_GROUP_ORDER = ["冠绝", "超凡", "万古", "传奇", "统帅", "中军", "卫士", "先锋", "未定级"]
+BREAKDOWN_SHEETS = [("分段位 (By Rank)", "rank_group", "段位"), ("分英雄 (By Hero)", "hero", "英雄"),
+                    ("分位置 (By Role)", "role", "位置")]
+
+# 报告输出配置：Excel 以 openpyxl 的 write-only 模式逐行写出；原始数据超过 EXCEL_MAX_RAW_ROWS 行时
+# 不再写入 Excel (上限为 1048576 行)，改为另存为 Parquet (需安装 pyarrow) 或按 RAW_SPILL_CSV_ROWS 行分块的 CSV
+EXCEL_MAX_RAW_ROWS = 200000
+RAW_SPILL_FORMAT = "auto"  # "auto" 有 pyarrow 时用 Parquet，否则用 CSV / "parquet" / "csv"
+RAW_SPILL_CSV_ROWS = 500000
+RAW_DATA_SHEET_NAME = "详细数据 (Raw Data)"
+CATEGORICAL_COLUMNS = ("Analysis_Status", "Medal", "Hero", "Role")  # 重复出现的中文字符串，以 category 类型存储
+
+# 解析等待调度配置：未解析的比赛按指数退避重新查询，超过总等待时限后记为经济数据缺失
+PARSE_POLL_INITIAL_DELAY_SECONDS = 5
+PARSE_POLL_MAX_DELAY_SECONDS = 60
+PARSE_WAIT_DEADLINE_SECONDS = 180
+
+# 并发抓取与限流配置 (OpenDota 免费额度约为 60 次/分钟)
+FETCH_MODE = "concurrent"  # "concurrent" 并发模式 / "sequential" 顺序模式 (旧版固定间隔，作为兜底)
+MAX_CONCURRENT_REQUESTS = 8
+RATE_LIMIT_PER_SECOND = 1
+RATE_LIMIT_PER_MINUTE = 60
+SEQUENTIAL_DELAY_SECONDS = 1.2
+HTTP_MAX_RETRIES = 3
+HTTP_TIMEOUT_SECONDS = 20
+API_KEY = os.environ.get("OPENDOTA_API_KEY")  # 可选的 OpenDota API Key，多机采集时每个 worker 可使用各自的额度
+
+# 本地持久化缓存配置 (已解析的比赛永久保存，未解析的比赛和英雄表按 TTL 过期)
+CACHE_ENABLED = True
+CACHE_DB_PATH = os.path.join("cache", "opendota_cache.sqlite3")
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+UNPARSED_MATCH_TTL_SECONDS = 10 * 60
+HEROES_CACHE_TTL_SECONDS = 7 * 24 * 3600
+MATCH_URL_PATTERN = re.compile(r"/matches/(\d+)$")
+
+MATCH_DECODE_ERRORS = (requests.RequestException, ValueError, Urllib3HTTPError) + ((ijson.JSONError,) if ijson else ())
+
+# 比赛详情解码方式："auto" 自动选择 / "stream" ijson 流式解析 / "orjson" / "json"
+# 无论哪种方式都只保留分析用到的字段 (见 compact_match_record)，缓存中也只保存精简后的记录
+MATCH_DECODER = "auto"
+MATCH_STREAM_BUFFER_BYTES = 4096  # ijson 的 C 后端会把整块数据的事件一次性生成，块越小峰值内存越低
+MATCH_STREAM_PREFIXES = frozenset(["match_id", "start_time", "radiant_win", "radiant_gold_adv", "radiant_gold_adv.item",
+                                   "players.item"] + [f"players.item.{field}" for field in MATCH_RECORD_PLAYER_FIELDS])
+
+# 列式数据集配置：经济曲线与少量比赛/玩家字段以 .npy 形式保存，可内存映射打开
+# 每次保存写入一个新的版本子目录，再原子替换 meta.json 指向它；更新过程由锁文件在进程间互斥
+DATASET_DIRECTORY = os.path.join("datasets", "matches")
+DATASET_LOCK_STALE_SECONDS = 600  # 锁文件超过该时间未释放 (持有进程已异常退出) 视为失效
+DATASET_PLAYER_SLOTS = 10
+DATASET_MATCH_COLUMNS = {"match_id": np.int64, "start_time": np.int64, "radiant_win": np.int8}
+DATASET_PLAYER_COLUMNS = {"account_id": np.int64, "is_radiant": np.int8, "hero_id": np.int16, "rank_tier": np.int16,
+                          "lane_role": np.int8}
+
+# 运行指标配置：直方图分桶 (秒)，与 Prometheus 默认分桶相近
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ENDPOINT_ID_PATTERN = re.compile(r"/\d+(?=/|$)")
+PROFILE_TOP_FUNCTIONS = 25
+
+
+# ==============================================================================
+# 运行指标 (各接口延迟直方图、重试/错误计数、限流等待、解析成功率、各阶段耗时)
+# ==============================================================================
+class PipelineMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters = {}  # (指标名, 标签) -> 数值
+        self.histograms = {}  # (指标名, 标签) -> {"buckets": [...], "sum": 秒, "count": 次数, "max": 秒}
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"buckets": [0] * len(METRICS_LATENCY_BUCKETS), "sum": 0.0,
+                                                    "count": 0, "max": 0.0}
+            for i, upper_bound in enumerate(METRICS_LATENCY_BUCKETS):
+                if seconds <= upper_bound:
+                    histogram['buckets'][i] += 1
+                    break
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+            histogram['max'] = max(histogram['max'], seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def counter_value(self, name, **labels):
+        with self.lock:
+            return sum(value for (key_name, key_labels), value in self.counters.items()
+                       if key_name == name and all(item in key_labels for item in labels.items()))
+
+    @staticmethod
+    def estimate_quantile(histogram, quantile):
+        # 取累计计数首次达到分位数的分桶上界；超出最大分桶时用观测到的最大值
+        target = quantile * histogram['count']
+        cumulative = 0
+        for upper_bound, count in zip(METRICS_LATENCY_BUCKETS, histogram['buckets']):
+            cumulative += count
+            if cumulative >= target:
+                return min(upper_bound, histogram['max'])
+        return histogram['max']
+
+    def summary(self):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: dict(value, buckets=list(value['buckets'])) for key, value in self.histograms.items()}
+        result = {"started_at": self.started_at, "elapsed_seconds": round(time.time() - self.started_at, 3),
+                  "counters": {}, "histograms": {}}
+        for (name, labels), value in sorted(counters.items()):
+            result['counters'].setdefault(name, []).append({"labels": dict(labels), "value": round(value, 6)})
+        for (name, labels), histogram in sorted(histograms.items()):
+            result['histograms'].setdefault(name, []).append({
+                "labels": dict(labels), "count": histogram['count'], "sum_seconds": round(histogram['sum'], 6),
+                "mean_seconds": round(histogram['sum'] / histogram['count'], 6) if histogram['count'] else 0.0,
+                "p50_seconds": self.estimate_quantile(histogram, 0.5),
+                "p99_seconds": self.estimate_quantile(histogram, 0.99), "max_seconds": round(histogram['max'], 6)})
+        # 解析成功率按不重复的比赛计算；查询命中率按每次查询计算 (包含等待解析期间的重复查询)
+        match_count = self.counter_value("dota_matches_total")
+        result['parse_success_ratio'] = (round(self.counter_value("dota_matches_parsed_total") / match_count, 4)
+                                         if match_count else None)
+        fetch_count = sum(self.counter_value("dota_match_fetch_total", result=r) for r in ("parsed", "unparsed"))
+        result['parse_poll_hit_ratio'] = (round(self.counter_value("dota_match_fetch_total", result="parsed")
+                                                / fetch_count, 4) if fetch_count else None)
+        cache = get_api_cache()
+        if cache is not None:
+            result['cache'] = cache.stats()
+        return result
+
+    def to_prometheus(self):
+        def format_labels(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ""
+            return "{" + ",".join(f'{key}="{str(value)}"' for key, value in items) + "}"
+
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: dict(value, buckets=list(value['buckets'])) for key, value in self.histograms.items()}
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {name} counter")
+            for (key_name, labels), value in sorted(counters.items()):
+                if key_name == name:
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (key_name, labels), histogram in sorted(histograms.items()):
+                if key_name != name:
+                    continue
+                cumulative = 0
+                for upper_bound, count in zip(METRICS_LATENCY_BUCKETS, histogram['buckets']):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels, [('le', upper_bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram['sum']:.6f}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram['count']}")
+        cache = get_api_cache()
+        if cache is not None:
+            stats = cache.stats()
+            lines.append("# TYPE dota_cache_lookups_total counter")
+            lines.append(f'dota_cache_lookups_total{{result="hit"}} {stats["hits"]}')
+            lines.append(f'dota_cache_lookups_total{{result="miss"}} {stats["misses"]}')
+            lines.append("# TYPE dota_cache_size_bytes gauge")
+            lines.append(f"dota_cache_size_bytes {stats['size_bytes']}")
+        return "\n".join(lines) + "\n"
+
+
+_metrics = PipelineMetrics()
+
+
+def get_metrics():
+    return _metrics
+
+
+def get_endpoint_label(url):
+    # /players/123/matches -> /players/{id}/matches，避免每个 ID 都成为单独的标签
+    return ENDPOINT_ID_PATTERN.sub("/{id}", urlsplit(url).path.rstrip('/').split('/api', 1)[-1]) or "/"
+
+
+def print_metrics_summary():
+    summary = get_metrics().summary()
+    print("\n--- 运行指标 ---")
+    for item in summary['histograms'].get('dota_http_request_seconds', []):
+        labels = item['labels']
+        print(f"  {labels['method']:<4} {labels['endpoint']:<26} {item['count']:>6} 次  "
+              f"p50 {item['p50_seconds'] * 1000:>7.0f} ms  p99 {item['p99_seconds'] * 1000:>7.0f} ms")
+    for item in summary['histograms'].get('dota_stage_seconds', []):
+        print(f"  阶段 {item['labels']['stage']:<24} 共 {item['sum_seconds']:.2f} 秒")
+    metrics = get_metrics()
+    print(f"  重试 {metrics.counter_value('dota_http_retries_total'):.0f} 次，"
+          f"HTTP 错误 {metrics.counter_value('dota_http_errors_total'):.0f} 次，"
+          f"限流等待共 {metrics.counter_value('dota_rate_limit_sleep_seconds_total'):.1f} 秒")
+    if summary['parse_success_ratio'] is not None:
+        print(f"  比赛解析成功率: {summary['parse_success_ratio'] * 100:.1f}%，"
+              f"单次查询命中已解析比赛的比例: {(summary['parse_poll_hit_ratio'] or 0) * 100:.1f}%")
+
+
+def export_metrics(json_path=None, prometheus_path=None):
+    metrics = get_metrics()
+    if json_path:
+        write_json_atomic(json_path, metrics.summary())
+        print(f"[INFO] 运行指标 (JSON) 已保存至: {os.path.abspath(json_path)}")
+    if prometheus_path:
+        with open(prometheus_path, 'w', encoding='utf-8') as f:
+            f.write(metrics.to_prometheus())
+        print(f"[INFO] 运行指标 (Prometheus) 已保存至: {os.path.abspath(prometheus_path)}")
 
 
 # ==============================================================================
 # 辅助函数
 # ==============================================================================
-def get_api_data(url):
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.base_rate = float(rate)
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def seconds_until_available(self, now):
+        self.refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class AdaptiveRateLimiter:
+    # 每秒 + 每分钟两个令牌桶同时生效；遇到 429 时暂停并减速，之后随成功请求逐步恢复
+    def __init__(self, per_second, per_minute, min_scale=0.25):
+        self.buckets = [TokenBucket(per_second, max(1, per_second)), TokenBucket(per_minute / 60.0, per_minute)]
+        self.min_scale = min_scale
+        self.scale = 1.0
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _set_scale(self, scale):
+        self.scale = scale
+        for bucket in self.buckets:
+            bucket.rate = bucket.base_rate * scale
+
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = max([self.paused_until - now] + [b.seconds_until_available(now) for b in self.buckets])
+                if wait <= 0:
+                    for bucket in self.buckets:
+                        bucket.tokens -= 1
+                    return waited
+            time.sleep(wait)
+            waited += wait
+
+    def on_throttled(self, retry_after):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            self._set_scale(max(self.min_scale, self.scale * 0.5))
+
+    def on_success(self):
+        with self.lock:
+            if self.scale < 1.0:
+                self._set_scale(min(1.0, self.scale * 1.05))
+
+
+_http_session = None
+_rate_limiter = None
+_fetch_engine_lock = threading.Lock()
+
+
+def configure_fetch_engine(mode=None, max_workers=None, per_second=None, per_minute=None, api_key=None):
+    global FETCH_MODE, MAX_CONCURRENT_REQUESTS, RATE_LIMIT_PER_SECOND, RATE_LIMIT_PER_MINUTE, API_KEY
+    global _http_session, _rate_limiter
+    if mode is not None:
+        if mode not in ("concurrent", "sequential"):
+            raise ValueError(f"未知的抓取模式: {mode}")
+        FETCH_MODE = mode
+    if max_workers is not None: MAX_CONCURRENT_REQUESTS = max(1, int(max_workers))
+    if per_second is not None: RATE_LIMIT_PER_SECOND = per_second
+    if per_minute is not None: RATE_LIMIT_PER_MINUTE = per_minute
+    if api_key is not None: API_KEY = api_key
+    with _fetch_engine_lock:
+        if _http_session is not None:
+            _http_session.close()
+        _http_session, _rate_limiter = None, None
+
+
+def get_http_session():
+    global _http_session
+    with _fetch_engine_lock:
+        if _http_session is None:
+            # 复用 keep-alive 连接池，连接数与并发线程数一致
+            adapter = HTTPAdapter(pool_connections=MAX_CONCURRENT_REQUESTS, pool_maxsize=MAX_CONCURRENT_REQUESTS)
+            _http_session = requests.Session()
+            _http_session.mount("https://", adapter)
+            _http_session.mount("http://", adapter)
+        return _http_session
+
+
+def get_rate_limiter():
+    global _rate_limiter
+    with _fetch_engine_lock:
+        if _rate_limiter is None:
+            _rate_limiter = AdaptiveRateLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_PER_MINUTE)
+        return _rate_limiter
+
+
+def parse_retry_after(value, default):
+    if not value:
+        return default
     try:
-        time.sleep(1.2)
-        response = requests.get(url, timeout=20)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+def send_api_request(method, url, stream=False):
+    session = get_http_session()
+    limiter = get_rate_limiter()
+    metrics = get_metrics()
+    endpoint = get_endpoint_label(url)
+    params = {"api_key": API_KEY} if API_KEY else None
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        if FETCH_MODE == "sequential":
+            time.sleep(SEQUENTIAL_DELAY_SECONDS)
+            metrics.inc("dota_rate_limit_sleep_seconds_total", SEQUENTIAL_DELAY_SECONDS)
+        else:
+            metrics.inc("dota_rate_limit_sleep_seconds_total", limiter.acquire())
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, params=params, timeout=HTTP_TIMEOUT_SECONDS, stream=stream)
+        except requests.RequestException as e:
+            metrics.inc("dota_http_errors_total", endpoint=endpoint, status=type(e).__name__)
+            raise
+        finally:
+            metrics.observe("dota_http_request_seconds", time.perf_counter() - started, endpoint=endpoint,
+                            method=method)
+        if response.status_code == 429 and attempt < HTTP_MAX_RETRIES:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'), default=2 ** (attempt + 1))
+            print(f"  > 触发API限流 (429)，{retry_after:.1f} 秒后重试...")
+            metrics.inc("dota_http_retries_total", endpoint=endpoint)
+            response.close()
+            limiter.on_throttled(retry_after)
+            if FETCH_MODE == "sequential":
+                time.sleep(retry_after)
+                metrics.inc("dota_rate_limit_sleep_seconds_total", retry_after)
+            continue
+        if response.status_code < 400:
+            limiter.on_success()
+        else:
+            metrics.inc("dota_http_errors_total", endpoint=endpoint, status=str(response.status_code))
+        return response
+
+
+def fetch_concurrently(func, items):
+    # 并发模式下在线程池中执行，结果顺序与输入一致；顺序模式保持逐个执行
+    items = list(items)
+    if FETCH_MODE == "sequential" or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(items))) as executor:
+        return list(executor.map(func, items))
+
+
+class ApiCache:
+    # SQLite 存储，值为 zlib 压缩后的 JSON；超过容量上限时按最近访问时间 (LRU) 淘汰
+    # 缓存文件由多个进程共享，总大小保存在 meta 表中并与写入/淘汰在同一个写事务内更新，不依赖各进程内存中的计数
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS api_cache (key TEXT PRIMARY KEY, payload BLOB NOT NULL, "
+                          "size INTEGER NOT NULL, expires_at REAL, last_access REAL NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_api_cache_last_access ON api_cache (last_access)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM api_cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+            # 打开时按实际内容重新校准一次总大小 (旧版本创建的缓存文件没有 meta 表)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) "
+                         "SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM api_cache")
+
+    @contextmanager
+    def transaction(self):
+        # 与 WorkQueue 相同：BEGIN IMMEDIATE 立即获取写锁，其他进程的写入要等本事务提交后才能进行
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    @property
+    def total_bytes(self):
+        with self.lock:
+            return self._read_total_bytes()
+
+    def _read_total_bytes(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'total_bytes'").fetchone()
+        return row[0] if row else 0
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT payload, expires_at FROM api_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] < now):
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE api_cache SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def is_permanent(self, key):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM api_cache WHERE key = ? AND expires_at IS NULL",
+                                     (key,)).fetchone() is not None
+
+    def put(self, key, value, ttl=None):
+        payload = zlib.compress(json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        now = time.time()
+        expires_at = None if ttl is None else now + ttl
+        with self.lock, self.transaction() as conn:
+            # 旧记录的大小和总大小都在写锁内读取，其他进程在此期间的写入/淘汰已全部反映在 meta 表中
+            old = conn.execute("SELECT size FROM api_cache WHERE key = ?", (key,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO api_cache (key, payload, size, expires_at, last_access) "
+                         "VALUES (?, ?, ?, ?, ?)", (key, payload, len(payload), expires_at, now))
+            total_bytes = self._read_total_bytes() + len(payload) - (old[0] if old else 0)
+            total_bytes = self._evict(conn, total_bytes)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('total_bytes', ?)", (total_bytes,))
+
+    def _evict(self, conn, total_bytes):
+        while total_bytes > self.max_bytes:
+            rows = conn.execute("SELECT key, size FROM api_cache ORDER BY last_access LIMIT 64").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if total_bytes <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM api_cache WHERE key = ?", (key,))
+                total_bytes -= size
+                self.evictions += 1
+        return total_bytes
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0, "size_bytes": self.total_bytes}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_api_cache = None
+
+
+def configure_cache(enabled=None, path=None, max_bytes=None):
+    global CACHE_ENABLED, CACHE_DB_PATH, CACHE_MAX_BYTES, _api_cache
+    if enabled is not None: CACHE_ENABLED = enabled
+    if path is not None: CACHE_DB_PATH = path
+    if max_bytes is not None: CACHE_MAX_BYTES = max_bytes
+    with _fetch_engine_lock:
+        if _api_cache is not None:
+            _api_cache.close()
+        _api_cache = None
+
+
+def get_api_cache():
+    global _api_cache
+    if not CACHE_ENABLED:
+        return None
+    with _fetch_engine_lock:
+        if _api_cache is None:
+            _api_cache = ApiCache(CACHE_DB_PATH, CACHE_MAX_BYTES)
+        return _api_cache
+
+
+def get_cache_key(url):
+    # 只缓存不会变化 (或变化很慢) 的接口：比赛详情与英雄表；玩家比赛列表每次都需要重新获取
+    path = urlsplit(url).path.rstrip('/')
+    match = MATCH_URL_PATTERN.search(path)
+    if match:
+        return f"match:{match.group(1)}"
+    if path.endswith('/heroes'):
+        return "heroes"
+    return None
+
+
+def get_cache_ttl(cache_key, data):
+    if cache_key == "heroes":
+        return HEROES_CACHE_TTL_SECONDS
+    return None if data.get('radiant_gold_adv') else UNPARSED_MATCH_TTL_SECONDS
+
+
+def is_match_parsed_in_cache(match_id):
+    cache = get_api_cache()
+    return cache is not None and cache.is_permanent(f"match:{match_id}")
+
+
+def print_cache_stats():
+    cache = get_api_cache()
+    if cache is None:
+        return
+    stats = cache.stats()
+    print(f"[INFO] 本地缓存命中 {stats['hits']} 次，未命中 {stats['misses']} 次 (命中率 {stats['hit_rate'] * 100:.1f}%)，"
+          f"淘汰 {stats['evictions']} 条，当前占用 {stats['size_bytes'] / 1024 / 1024:.1f} MB")
+
+
+def iter_concurrently(func, items):
+    # 与 fetch_concurrently 相同，但按完成顺序逐个产出 (item, result)，便于边下载边分析
+    items = list(items)
+    if FETCH_MODE == "sequential" or len(items) <= 1:
+        for item in items:
+            yield item, func(item)
+        return
+    executor = ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(items)))
+    futures = {executor.submit(func, item): item for item in items}
+    try:
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # 中断 (Ctrl-C)、调用方出错或提前关闭时取消尚未开始的请求，不再让它们在限流器下逐个执行完
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+_missing_decoder_warned = False
+
+
+def get_match_decoder():
+    global _missing_decoder_warned
+    if MATCH_DECODER != "auto":
+        library = {"stream": ("ijson", ijson), "orjson": ("orjson", orjson)}.get(MATCH_DECODER)
+        if library is not None and library[1] is None:
+            # 指定的解码库未安装时回退到标准库 json，而不是让每个比赛请求都失败
+            if not _missing_decoder_warned:
+                _missing_decoder_warned = True
+                print(f"[WARNING] 未安装 {library[0]}，无法使用 \"{MATCH_DECODER}\" 解码方式，改用标准库 json")
+            return "json"
+        return MATCH_DECODER
+    # orjson 一次性解码后立即投影，CPU 开销最低；流式解析内存占用最低但逐事件处理更慢，纯 Python 后端的 ijson 则更慢
+    if orjson is not None:
+        return "orjson"
+    if ijson is not None and ijson.backend in ("yajl2_c", "yajl2_cffi"):
+        return "stream"
+    return "json"
+
+
+def stream_match_record(raw):
+    # 逐个事件解析响应流，只把需要的字段放进内存，逐玩家日志等大字段直接跳过
+    record = {"players": []}
+    for prefix, event, value in ijson.parse(raw, buf_size=MATCH_STREAM_BUFFER_BYTES):
+        if prefix not in MATCH_STREAM_PREFIXES:
+            continue
+        if prefix == "players.item":
+            if event == "start_map":
+                record['players'].append({})
+        elif prefix == "radiant_gold_adv.item":
+            record['radiant_gold_adv'].append(int(value))
+        elif prefix == "radiant_gold_adv":
+            if event == "start_array":
+                record['radiant_gold_adv'] = []
+            elif event == "null":
+                record['radiant_gold_adv'] = None
+        elif prefix.startswith("players.item."):
+            record['players'][-1][prefix[13:]] = value
+        else:
+            record[prefix] = value
+    return record if 'match_id' in record else {key: value for key, value in record.items() if key != 'players'}
+
+
+def decode_match_response(response, decoder):
+    if decoder == "stream":
+        response.raw.decode_content = True
+        return stream_match_record(response.raw)
+    content = response.content
+    return compact_match_record(orjson.loads(content) if decoder == "orjson" else json.loads(content))
+
+
+def get_api_data(url, refresh=False):
+    cache = get_api_cache()
+    cache_key = get_cache_key(url) if cache is not None else None
+    if cache_key and not refresh:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            # 旧版本缓存中可能是完整的比赛 JSON，读出时同样只保留需要的字段
+            return compact_match_record(cached) if cache_key.startswith("match:") else cached
+    decoder = get_match_decoder() if MATCH_URL_PATTERN.search(urlsplit(url).path.rstrip('/')) else None
+    try:
+        response = send_api_request("GET", url, stream=decoder == "stream")
+        try:
+            response.raise_for_status()
+            with get_metrics().timer("dota_json_decode_seconds", endpoint=get_endpoint_label(url)):
+                data = decode_match_response(response, decoder) if decoder else response.json()
+        finally:
+            response.close()
+    except MATCH_DECODE_ERRORS as e:
         print(f"  > API GET请求失败: {e}")
         return None
+    if cache_key and data:
+        cache.put(cache_key, data, get_cache_ttl(cache_key, data))
+    return data
 
 
 def post_api_request(url):
     try:
-        time.sleep(1.2)
-        response = requests.post(url, timeout=20)
+        response = send_api_request("POST", url)
         if response.status_code == 200:
             print(f"  > 成功提交解析请求: {url}")
     except requests.RequestException:
         pass
 
 
-def set_chinese_font():
+def set_chinese_font(verbose=True):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     try:
         sns.set_theme(style="whitegrid")
         plt.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'Heiti TC', 'Arial Unicode MS']
         plt.rcParams['axes.unicode_minus'] = False
-        print("\n[INFO] 已尝试加载中文支持字体。")
+        if verbose:
+            print("\n[INFO] 已尝试加载中文支持字体。")
     except Exception as e:
         print(f"[WARNING] 未能成功加载中文字体，图表中的中文可能显示为方框。错误: {e}")
 
@@ -67,6 +738,458 @@ def get_first_to_advantage_threshold(match_data, is_radiant, threshold):
     return 0
 
 
+# ==============================================================================
+# 列式比赛数据集 (内存映射 .npy，零拷贝打开)
+# ==============================================================================
+class MatchDataset:
+    # 所有比赛的经济曲线拼接为一个扁平 int32 数组，offsets[i]:offsets[i + 1] 为第 i 场比赛的区间；
+    # 其余字段为定长列，玩家字段为 (比赛数, 10) 的二维数组。数据按 match_id 升序存放
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns['match_id'])
+
+    @property
+    def gold_adv(self):
+        return self.columns['gold_adv']
+
+    @property
+    def offsets(self):
+        return self.columns['offsets']
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    @classmethod
+    def empty(cls):
+        columns = {'gold_adv': np.zeros(0, dtype=np.int32), 'offsets': np.zeros(1, dtype=np.int64)}
+        columns.update({name: np.zeros(0, dtype=dtype) for name, dtype in DATASET_MATCH_COLUMNS.items()})
+        columns.update({name: np.zeros((0, DATASET_PLAYER_SLOTS), dtype=dtype)
+                        for name, dtype in DATASET_PLAYER_COLUMNS.items()})
+        return cls(columns)
+
+    @classmethod
+    def open(cls, directory=None):
+        directory = directory or DATASET_DIRECTORY
+        names = ['gold_adv', 'offsets'] + list(DATASET_MATCH_COLUMNS) + list(DATASET_PLAYER_COLUMNS)
+        for _ in range(3):
+            meta_path = os.path.join(directory, "meta.json")
+            if not os.path.exists(meta_path):
+                return None
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            # 旧版数据集 (version 1) 的文件直接放在目录下
+            data_directory = os.path.join(directory, meta['current']) if meta.get('current') else directory
+            try:
+                dataset = cls({name: np.load(os.path.join(data_directory, f"{name}.npy"), mmap_mode='r')
+                               for name in names})
+            except FileNotFoundError:
+                # 读取 meta.json 之后另一个进程恰好完成了保存并清理了旧版本，重新读取指针
+                continue
+            if not dataset.matches_meta(meta):
+                print(f"[WARNING] 数据集 {directory} 中的文件与 meta.json 不一致 (可能是旧版本保存时被中断)，已忽略")
+                return None
+            return dataset
+        return None
+
+    def matches_meta(self, meta):
+        count = meta.get('matches')
+        offsets = self.offsets
+        return (len(offsets) == count + 1 and int(offsets[-1]) == len(self.gold_adv) == meta.get('samples')
+                and all(len(self.columns[name]) == count
+                        for name in list(DATASET_MATCH_COLUMNS) + list(DATASET_PLAYER_COLUMNS)))
+
+    def save(self, directory=None):
+        directory = directory or DATASET_DIRECTORY
+        os.makedirs(directory, exist_ok=True)
+        # 全部文件写入新的版本目录后，再原子替换 meta.json 切换到新版本；中途中断时旧版本保持完整
+        version = f"v{time.time_ns()}_{os.getpid()}_{threading.get_ident()}"
+        version_directory = os.path.join(directory, version)
+        os.makedirs(version_directory)
+        for name, values in self.columns.items():
+            np.save(os.path.join(version_directory, f"{name}.npy"), np.ascontiguousarray(values))
+        temp_path = os.path.join(directory, "meta.tmp.json")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": 2, "current": version, "matches": len(self), "samples": int(len(self.gold_adv))}, f)
+        os.replace(temp_path, os.path.join(directory, "meta.json"))
+        remove_stale_dataset_versions(directory, version)
+
+    def index_of(self, match_ids):
+        # 返回每个 match_id 在数据集中的行号，不存在时为 -1
+        match_ids = np.asarray(match_ids, dtype=np.int64)
+        stored = self.columns['match_id']
+        if not len(stored):
+            return np.full(len(match_ids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(stored, match_ids), len(stored) - 1)
+        return np.where(stored[positions] == match_ids, positions, -1)
+
+    def series(self, index):
+        return self.gold_adv[self.offsets[index]:self.offsets[index + 1]]
+
+    def gather_positions(self, indexes):
+        lengths = self.lengths[indexes]
+        starts = np.asarray(self.offsets[:-1])[indexes]
+        new_offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        positions = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+        return positions, lengths, new_offsets
+
+    def gold_adv_matrix(self, indexes):
+        # 取出指定比赛的经济曲线并右侧补 0 成二维数组；补 0 不会越过任何正阈值
+        indexes = np.asarray(indexes, dtype=np.int64)
+        positions, lengths, _ = self.gather_positions(indexes)
+        width = int(lengths.max()) if len(lengths) else 0
+        matrix = np.zeros((len(indexes), width), dtype=np.int32)
+        if width:
+            matrix[np.arange(width) < lengths[:, None]] = self.gold_adv[positions]
+        return matrix
+
+    def take(self, indexes):
+        indexes = np.asarray(indexes, dtype=np.int64)
+        positions, _, new_offsets = self.gather_positions(indexes)
+        columns = {'gold_adv': np.asarray(self.gold_adv[positions], dtype=np.int32), 'offsets': new_offsets}
+        for name in list(DATASET_MATCH_COLUMNS) + list(DATASET_PLAYER_COLUMNS):
+            columns[name] = np.asarray(self.columns[name][indexes])
+        return MatchDataset(columns)
+
+    def merge(self, other):
+        # 合并两个数据集，match_id 重复时保留 other 中的新数据，结果按 match_id 排序
+        if not len(other):
+            return self
+        keep = np.flatnonzero(~np.isin(self.columns['match_id'], other.columns['match_id']))
+        kept = self.take(keep)
+        columns = {'gold_adv': np.concatenate([kept.gold_adv, other.gold_adv]),
+                   'offsets': np.concatenate([kept.offsets, other.offsets[1:] + kept.offsets[-1]])}
+        for name in list(DATASET_MATCH_COLUMNS) + list(DATASET_PLAYER_COLUMNS):
+            columns[name] = np.concatenate([kept.columns[name], other.columns[name]])
+        merged = MatchDataset(columns)
+        return merged.take(np.argsort(merged.columns['match_id'], kind='stable'))
+
+
+class MatchDatasetBuilder:
+    def __init__(self):
+        self.series = []
+        self.values = {name: [] for name in list(DATASET_MATCH_COLUMNS) + list(DATASET_PLAYER_COLUMNS)}
+
+    def __len__(self):
+        return len(self.series)
+
+    def add(self, match_details):
+        if not match_details or not match_details.get('radiant_gold_adv'):
+            return
+        self.series.append(np.asarray(match_details['radiant_gold_adv'], dtype=np.int32))
+        self.values['match_id'].append(match_details['match_id'])
+        self.values['start_time'].append(match_details.get('start_time') or 0)
+        self.values['radiant_win'].append(1 if match_details.get('radiant_win') else 0)
+        players = (match_details.get('players') or [])[:DATASET_PLAYER_SLOTS]
+        padding = [{}] * (DATASET_PLAYER_SLOTS - len(players))
+        for name, field in (('account_id', 'account_id'), ('hero_id', 'hero_id'), ('rank_tier', 'rank_tier'),
+                            ('lane_role', 'lane_role')):
+            self.values[name].append([player.get(field) or 0 for player in players + padding])
+        self.values['is_radiant'].append([1 if player.get('isRadiant') else 0 for player in players + padding])
+
+    def build(self):
+        if not self.series:
+            return MatchDataset.empty()
+        lengths = np.fromiter((len(series) for series in self.series), dtype=np.int64, count=len(self.series))
+        columns = {'gold_adv': np.concatenate(self.series),
+                   'offsets': np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)}
+        for name, dtype in DATASET_MATCH_COLUMNS.items():
+            columns[name] = np.asarray(self.values[name], dtype=dtype)
+        for name, dtype in DATASET_PLAYER_COLUMNS.items():
+            columns[name] = np.asarray(self.values[name], dtype=dtype).reshape(-1, DATASET_PLAYER_SLOTS)
+        dataset = MatchDataset(columns)
+        # 同一场比赛只保留一份，并按 match_id 排序
+        _, first = np.unique(dataset.columns['match_id'], return_index=True)
+        return dataset.take(first)
+
+
+def compact_match_record(match_details):
+    # 只保留列式数据集和逐行分析用到的字段；错误应答 (没有 match_id) 原样返回
+    if not isinstance(match_details, dict) or 'match_id' not in match_details:
+        return match_details
+    return {"match_id": match_details['match_id'], "start_time": match_details.get('start_time'),
+            "radiant_win": match_details.get('radiant_win'), "radiant_gold_adv": match_details.get('radiant_gold_adv'),
+            "players": [{field: player.get(field) for field in MATCH_RECORD_PLAYER_FIELDS}
+                        for player in match_details.get('players') or []]}
+
+
+def remove_stale_dataset_versions(directory, current):
+    # 清理旧版本目录及旧版 (version 1) 平铺的 .npy 文件；仍被其他进程内存映射的文件 (Windows) 留到下次保存再清理
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name != current and name.startswith("v") and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif name.endswith(".npy"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+@contextmanager
+def dataset_lock(directory):
+    # 以独占方式创建锁文件实现跨进程互斥 (批处理、多个队列 report 可能同时更新数据集)
+    os.makedirs(directory, exist_ok=True)
+    lock_path = os.path.join(directory, "update.lock")
+    while True:
+        try:
+            lock_fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > DATASET_LOCK_STALE_SECONDS:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue
+            time.sleep(0.2)
+    try:
+        os.write(lock_fd, str(os.getpid()).encode())
+        yield
+    finally:
+        os.close(lock_fd)
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
+def update_match_dataset(new_dataset, directory=None):
+    directory = directory or DATASET_DIRECTORY
+    with dataset_lock(directory):
+        existing = MatchDataset.open(directory)
+        if existing is None:
+            merged = new_dataset
+        elif not len(new_dataset):
+            return existing
+        else:
+            merged = existing.merge(new_dataset)
+        # 释放旧版本的内存映射后再保存，保存结束时旧版本目录才能被删除 (Windows 下被映射的文件无法删除)
+        existing = None
+        merged.save(directory)
+    return MatchDataset.open(directory)
+
+
+# ==============================================================================
+# 经济优势阈值扫描 (NumPy 向量化，一次计算所有阈值)
+# ==============================================================================
+def count_threshold_crossings(gold_adv_matrix, is_radiant, won_match, thresholds, minute_bins):
+    # 与 get_first_to_advantage_threshold 的判定一致：己方先达到 +阈值 记为领先，对方先达到或双方都未达到记为劣势
+    won_match = np.asarray(won_match, dtype=bool)
+    rows, width = gold_adv_matrix.shape
+    own_adv = gold_adv_matrix * np.where(np.asarray(is_radiant, dtype=bool), 1, -1)[:, None]
+    if width:
+        running_max = np.maximum.accumulate(own_adv, axis=1)
+        running_min = np.minimum.accumulate(own_adv, axis=1)
+        # 累计最大/最小值单调，首次越过阈值的下标即为尚未越过的位置数 (从未越过时等于 width)
+        first_lead = (running_max[None, :, :] < thresholds[:, None, None]).sum(axis=2)
+        first_trail = (running_min[None, :, :] > -thresholds[:, None, None]).sum(axis=2)
+    else:
+        first_lead = first_trail = np.zeros((len(thresholds), rows), dtype=np.int64)
+    took_lead = first_lead < first_trail
+    first_reached = np.minimum(first_lead, first_trail)
+    reached = first_reached < width
+    minute_hist = np.zeros((len(thresholds), minute_bins), dtype=np.int64)
+    threshold_rows, match_rows = np.nonzero(reached)
+    np.add.at(minute_hist, (threshold_rows, first_reached[threshold_rows, match_rows]), 1)
+    return {"lead_games": took_lead.sum(axis=1), "lead_wins": (took_lead & won_match).sum(axis=1),
+            "comeback_games": (~took_lead).sum(axis=1), "comeback_wins": (~took_lead & won_match).sum(axis=1),
+            "minute_hist": minute_hist}
+
+
+def summarize_threshold_counts(thresholds, counts, sample_count):
+    import pandas as pd
+    minute_hist = counts['minute_hist']
+    reached = minute_hist.sum(axis=1)
+    minutes = np.arange(minute_hist.shape[1])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        lead_win_rate = counts['lead_wins'] / counts['lead_games'] * 100
+        comeback_rate = counts['comeback_wins'] / counts['comeback_games'] * 100
+        reached_ratio = reached / max(sample_count, 1) * 100
+        mean_minute = (minute_hist * minutes).sum(axis=1) / reached
+    # 由分钟直方图求中位数，分块统计后也能得到精确结果
+    cumulative = np.cumsum(minute_hist, axis=1)
+    median_minute = np.where(reached > 0, (cumulative < (reached[:, None] + 1) / 2).sum(axis=1), np.nan)
+    return pd.DataFrame({
+        "经济领先阈值": thresholds, "有效样本数": sample_count,
+        "率先达到领先局数": counts['lead_games'], "领先后胜率(%)": np.round(lead_win_rate, 2),
+        "未率先达到领先局数": counts['comeback_games'], "翻盘成功率(%)": np.round(comeback_rate, 2),
+        "达到该阈值的比赛占比(%)": np.round(reached_ratio, 2),
+        "首次达到阈值的平均分钟": np.round(mean_minute, 1), "首次达到阈值的中位分钟": median_minute})
+
+
+def merge_threshold_counts(totals, counts):
+    if totals is None:
+        return counts
+    # 不同批次的分钟直方图长度可能不同，先补齐再相加
+    width = max(totals['minute_hist'].shape[1], counts['minute_hist'].shape[1])
+    merged = {key: totals[key] + counts[key] for key in totals if key != 'minute_hist'}
+    merged['minute_hist'] = sum(np.pad(part['minute_hist'], ((0, 0), (0, width - part['minute_hist'].shape[1])))
+                                for part in (totals, counts))
+    return merged
+
+
+def count_threshold_sweep(dataset, match_indexes, is_radiant, won_match, thresholds):
+    # 按块从 (内存映射的) 数据集中取出经济曲线，内存占用与总样本数无关
+    match_indexes = np.asarray(match_indexes, dtype=np.int64)
+    is_radiant, won_match = np.asarray(is_radiant), np.asarray(won_match)
+    minute_bins = int(dataset.lengths.max()) if len(dataset) else 0
+    totals = count_threshold_crossings(np.zeros((0, 0), dtype=np.int32), [], [], thresholds, minute_bins)
+    for start in range(0, len(match_indexes), SWEEP_CHUNK_ROWS):
+        chunk = slice(start, start + SWEEP_CHUNK_ROWS)
+        totals = merge_threshold_counts(totals, count_threshold_crossings(
+            dataset.gold_adv_matrix(match_indexes[chunk]), is_radiant[chunk], won_match[chunk], thresholds,
+            minute_bins))
+    return totals
+
+
+def get_sweep_thresholds(config):
+    thresholds = set(config.get('sweep_thresholds') or DEFAULT_SWEEP_THRESHOLDS) | {config['threshold']}
+    return np.asarray(sorted(thresholds), dtype=np.int64)
+
+
+# ==============================================================================
+# 多维聚合 (段位 × 英雄 × 位置 × 是否率先领先) 与胜率置信区间
+# ==============================================================================
+class AggregationCube:
+    # 一次遍历同时累加所有维度组合的局数/胜场，任意分组统计都由边际求和得到
+    DIMENSIONS = ("rank_group", "hero", "role", "lead")
+    LABEL_DIMENSIONS = DIMENSIONS[:-1]
+
+    def __init__(self):
+        self.labels = {dim: [] for dim in self.LABEL_DIMENSIONS}
+        self.positions = {dim: {} for dim in self.LABEL_DIMENSIONS}
+        self.games = np.zeros((0, 0, 0, 2), dtype=np.int64)
+        self.wins = np.zeros((0, 0, 0, 2), dtype=np.int64)
+
+    @classmethod
+    def from_state(cls, state):
+        cube = cls()
+        for dim in cls.LABEL_DIMENSIONS:
+            for label in state['labels'][dim]:
+                cube.get_label_index(dim, label)
+        cube.grow()
+        if state['cells']:
+            cells = tuple(np.asarray(state['cells'], dtype=np.int64).T)
+            cube.games[cells] = state['games']
+            cube.wins[cells] = state['wins']
+        return cube
+
+    def to_state(self):
+        # 立方体大多为空，只保存非零单元
+        cells = np.nonzero(self.games)
+        return {"labels": self.labels, "cells": np.stack(cells, axis=1).tolist(),
+                "games": self.games[cells].tolist(), "wins": self.wins[cells].tolist()}
+
+    def get_label_index(self, dim, label):
+        positions = self.positions[dim]
+        if label not in positions:
+            positions[label] = len(self.labels[dim])
+            self.labels[dim].append(label)
+        return positions[label]
+
+    def encode(self, dim, values):
+        uniques, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+        codes = np.array([self.get_label_index(dim, str(label)) for label in uniques], dtype=np.int64)
+        return codes[inverse.reshape(-1)]
+
+    def grow(self):
+        shape = tuple(len(self.labels[dim]) for dim in self.LABEL_DIMENSIONS) + (2,)
+        if shape != self.games.shape:
+            padding = [(0, new - old) for new, old in zip(shape, self.games.shape)]
+            self.games, self.wins = np.pad(self.games, padding), np.pad(self.wins, padding)
+
+    def add(self, rank_groups, heroes, roles, lead, won):
+        cells = (self.encode("rank_group", rank_groups), self.encode("hero", heroes), self.encode("role", roles),
+                 np.asarray(lead, dtype=np.int64))
+        self.grow()
+        np.add.at(self.games, cells, 1)
+        np.add.at(self.wins, cells, np.asarray(won, dtype=np.int64))
+
+    def marginal(self, *dims):
+        # 返回按 DIMENSIONS 顺序排列的 (局数, 胜场)，未列出的维度求和消去
+        axes = tuple(axis for axis, dim in enumerate(self.DIMENSIONS) if dim not in dims)
+        return self.games.sum(axis=axes), self.wins.sum(axis=axes)
+
+    def breakdown(self, dim):
+        # 某一维度下每个取值的 (局数, 胜场)，形状为 (取值数, 2)，第二维为是否率先领先
+        games, wins = self.marginal(dim, "lead")
+        return self.labels[dim], games, wins
+
+
+def get_z_score(confidence_level):
+    return statistics.NormalDist().inv_cdf((1 + confidence_level) / 2)
+
+
+def wilson_interval(wins, games, confidence_level=CONFIDENCE_LEVEL):
+    wins, games = np.asarray(wins, dtype=np.float64), np.asarray(games, dtype=np.float64)
+    z = get_z_score(confidence_level)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rate = wins / games
+        denominator = 1 + z ** 2 / games
+        center = (rate + z ** 2 / (2 * games)) / denominator
+        half_width = z * np.sqrt(rate * (1 - rate) / games + z ** 2 / (4 * games ** 2)) / denominator
+    return np.where(games > 0, center - half_width, np.nan), np.where(games > 0, center + half_width, np.nan)
+
+
+def bootstrap_interval(wins, games, confidence_level=CONFIDENCE_LEVEL, samples=BOOTSTRAP_SAMPLES, seed=BOOTSTRAP_SEED):
+    # 百分位自助法：对每组的 n 局胜负结果有放回地重抽样 samples 次。胜负为 0/1 结果，重抽样后的胜场数服从
+    # Binomial(n, 观测胜率)，因此所有分组可用一个 (samples, 分组数) 的二项分布矩阵一次完成
+    wins, games = np.asarray(wins, dtype=np.int64), np.asarray(games, dtype=np.int64)
+    shape = games.shape
+    wins, games = wins.reshape(-1), games.reshape(-1)
+    rate = np.divide(wins, games, out=np.zeros(len(games)), where=games > 0)
+    draws = np.random.default_rng(seed).binomial(games, rate, size=(samples, len(games))) / np.maximum(games, 1)
+    alpha = (1 - confidence_level) / 2 * 100
+    low, high = np.percentile(draws, [alpha, 100 - alpha], axis=0)
+    # 全胜或全负的分组每次重抽样结果都相同，自助区间宽度为 0；这些分组改用 Wilson 区间
+    boundary = (wins == 0) | (wins == games)
+    if boundary.any():
+        wilson_low, wilson_high = wilson_interval(wins, games, confidence_level)
+        low, high = np.where(boundary, wilson_low, low), np.where(boundary, wilson_high, high)
+    return (np.where(games > 0, low, np.nan).reshape(shape), np.where(games > 0, high, np.nan).reshape(shape))
+
+
+def confidence_interval(wins, games, method=None):
+    method = method or CI_METHOD
+    if method == "bootstrap":
+        return bootstrap_interval(wins, games)
+    if method == "wilson":
+        return wilson_interval(wins, games)
+    raise ValueError(f"未知的置信区间方法: {method}")
+
+
+def format_rate_interval(wins, games):
+    low, high = confidence_interval([wins], [games])
+    return f"{low[0] * 100:.2f}% ~ {high[0] * 100:.2f}%"
+
+
+def build_breakdown_table(cube, dim, label_title):
+    import pandas as pd
+    labels, games, wins = cube.breakdown(dim)
+    if not labels:
+        return pd.DataFrame()
+    low, high = confidence_interval(wins, games)
+    level = f"{CONFIDENCE_LEVEL * 100:g}%"
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rate = np.round(wins / games * 100, 2)
+        overall_rate = np.round(wins.sum(axis=1) / games.sum(axis=1) * 100, 2)
+    low, high = np.round(low * 100, 2), np.round(high * 100, 2)
+    table = pd.DataFrame({
+        label_title: labels, "总局数": games.sum(axis=1), "胜率(%)": overall_rate,
+        "率先达到领先局数": games[:, 1], "领先后胜率(%)": rate[:, 1],
+        f"领先后胜率{level}下限(%)": low[:, 1], f"领先后胜率{level}上限(%)": high[:, 1],
+        "未率先达到领先局数": games[:, 0], "翻盘成功率(%)": rate[:, 0],
+        f"翻盘成功率{level}下限(%)": low[:, 0], f"翻盘成功率{level}上限(%)": high[:, 0]})
+    if dim == "rank_group":
+        order = {rank: position for position, rank in enumerate(RANK_GROUP_ORDER)}
+        return table.sort_values(label_title, key=lambda column: column.map(lambda rank: order.get(rank, len(order))),
+                                 ignore_index=True)
+    return table.sort_values(["总局数", label_title], ascending=[False, True], ignore_index=True)
+
+
 # ==============================================================================
 # 交互式获取用户输入
 # ==============================================================================
@@ -110,312 +1233,1589 @@ def get_user_input():
                 print("请输入一个大于0的数字。")
         except ValueError:
             print("输入无效，必须是纯数字。")
+    if config['mode'] == '1':
+        while True:
+            target = input("请输入目标样本数 (将沿玩家关系逐层扩展直到达到该数量；直接回车则只采样您比赛中的玩家)\n> ").strip()
+            if not target:
+                break
+            if target.isdigit() and int(target) > 0:
+                config['sample_target'] = int(target)
+                brackets = input("只采样哪些段位？输入段位编号，用空格分隔 (1 先锋 ... 8 冠绝；直接回车则不限)\n> ").split()
+                config['rank_brackets'] = [int(b) for b in brackets if b.isdigit() and int(b) in RANK_BRACKETS]
+                break
+            print("请输入一个大于0的数字。")
     return config
 
 
 # ==============================================================================
 # 数据获取与分析的核心逻辑
 # ==============================================================================
-def fetch_and_analyze_match(match_id):
-    match_details = None
-    for attempt in range(RETRY_ATTEMPTS):
-        print(f"    > 正在获取比赛详情 (第 {attempt + 1}/{RETRY_ATTEMPTS} 次尝试)...")
-        details_attempt = get_api_data(f"{BASE_URL}/matches/{match_id}")
-        if details_attempt and details_attempt.get('radiant_gold_adv'):
-            print("    > 成功获取到经济数据！")
-            match_details = details_attempt
+_heroes_map = None
+
+
+def get_heroes_map():
+    # 同一进程内的多个任务共享英雄表，只请求 (或读取缓存) 一次
+    global _heroes_map
+    if _heroes_map is None:
+        heroes = get_api_data(f"{BASE_URL}/heroes")
+        if not heroes:
+            return {}
+        _heroes_map = {h['id']: h['localized_name'] for h in heroes}
+    return _heroes_map
+
+
+def fetch_and_analyze_match(match_id, refresh=False):
+    # 单次查询，不阻塞等待；比赛尚未解析时返回 None，由 iter_parsed_matches 负责重新查询
+    metrics = get_metrics()
+    with metrics.timer("dota_match_fetch_seconds"):
+        match_details = get_api_data(f"{BASE_URL}/matches/{match_id}", refresh=refresh)
+    if match_details and match_details.get('radiant_gold_adv'):
+        metrics.inc("dota_match_fetch_total", result="parsed")
+        return match_details
+    metrics.inc("dota_match_fetch_total", result="unparsed" if match_details else "error")
+    return None
+
+
+def iter_parsed_matches(match_ids):
+    # 已解析的比赛立即产出；未解析的比赛放入等待集合，按指数退避重新查询，直到总时限
+    deadline = time.monotonic() + PARSE_WAIT_DEADLINE_SECONDS
+    pending = {}  # match_id -> (下次查询时间, 当前退避间隔)
+    due = list(match_ids)
+    while due:
+        refresh_ids = set(pending)
+        with closing(iter_concurrently(lambda mid: fetch_and_analyze_match(mid, refresh=mid in refresh_ids),
+                                       due)) as results:
+            for match_id, match_details in results:
+                if match_details:
+                    pending.pop(match_id, None)
+                    print(f"    > [{match_id}] 成功获取到经济数据！")
+                    yield match_id, match_details
+                else:
+                    delay = min(pending[match_id][1] * 2, PARSE_POLL_MAX_DELAY_SECONDS) if match_id in pending \
+                        else PARSE_POLL_INITIAL_DELAY_SECONDS
+                    pending[match_id] = (time.monotonic() + delay, delay)
+        if not pending:
+            return
+        next_poll_at = min(poll_at for poll_at, _ in pending.values())
+        if next_poll_at > deadline:
             break
-        elif attempt < RETRY_ATTEMPTS - 1:
-            print(f"    > 经济数据尚未就绪，将在 {RETRY_DELAY_SECONDS} 秒后重试...")
-            time.sleep(RETRY_DELAY_SECONDS)
-        else:
-            print("    > 已达到最大重试次数，仍未获取到经济数据。")
-    return match_details
+        print(f"    > 仍有 {len(pending)} 场比赛等待解析，{max(0.0, next_poll_at - time.monotonic()):.0f} 秒后重新查询...")
+        time.sleep(max(0.0, next_poll_at - time.monotonic()))
+        # 相近时间到期的比赛合并为同一批查询，减少唤醒次数
+        now = time.monotonic() + 1.0
+        due = [match_id for match_id, (poll_at, _) in pending.items() if poll_at <= now]
+    print(f"    > 已达到解析等待时限，{len(pending)} 场比赛仍未获取到经济数据。")
+    for match_id in pending:
+        yield match_id, None
+
+
+def analyze_match_for_player(match_details, match_id, player_id, heroes_map, config, advantage_col_name):
+    row_data = {"Player_ID": player_id, "Analyzed_Match_ID": match_id}
+    if not match_details:
+        row_data["Analysis_Status"] = "经济数据缺失"
+        return row_data
+    player_data = next((p for p in match_details.get('players', []) if p.get('account_id') == player_id), None)
+    if player_data:
+        is_radiant = player_data.get('isRadiant', True)
+        radiant_win = match_details.get('radiant_win', False)
+        won_match = 1 if (is_radiant and radiant_win) or (not is_radiant and not radiant_win) else 0
+        row_data.update(
+            {"Analysis_Status": "成功", "Medal": RANK_TIERS.get(player_data.get('rank_tier'), "未定级"),
+             "Hero": heroes_map.get(player_data.get('hero_id'), "未知"),
+             "Role": LANE_ROLES.get(player_data.get('lane_role'), f"未知({player_data.get('lane_role')})"),
+             "Is_Radiant": 1 if is_radiant else 0, "Won_Match": won_match,
+             advantage_col_name: get_first_to_advantage_threshold(match_details, is_radiant,
+                                                                  config['threshold'])})
+    else:
+        row_data["Analysis_Status"] = "未找到玩家数据"
+    return row_data
+
+
+# ==============================================================================
+# 运行检查点：逐行追加写入结果，支持中断后 --resume 继续
+# ==============================================================================
+def get_job_config(config):
+    # 决定任务列表的全部参数，断点续跑时必须与已有运行完全一致
+    job_config = {key: config[key] for key in ('mode', 'account_id', 'scan_count', 'threshold')}
+    if config['mode'] == '1' and config.get('sample_target'):
+        job_config['sample_target'] = config['sample_target']
+        job_config['rank_brackets'] = sorted(config.get('rank_brackets') or [])
+    return job_config
+
+
+def get_job_key(config):
+    job_config = get_job_config(config)
+    job_key = (f"{'sample' if config['mode'] == '1' else 'personal'}_{config['account_id']}"
+               f"_n{config['scan_count']}_t{config['threshold']}")
+    if 'sample_target' in job_config:
+        job_key += f"_s{job_config['sample_target']}"
+        if job_config['rank_brackets']:
+            job_key += f"_b{''.join(str(bracket) for bracket in job_config['rank_brackets'])}"
+    return job_key
+
+
+def write_json_atomic(path, data):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def truncate_partial_line(path):
+    # 上次被强制终止时可能留下半行，先截掉，避免新追加的行与其粘连
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if not size:
+            return
+        f.seek(max(0, size - 65536))
+        tail = f.read()
+        if tail.endswith(b"\n") or (b"\n" not in tail and len(tail) < size):
+            return
+        f.truncate(size - len(tail) + tail.rfind(b"\n") + 1)
+
+
+def iter_json_lines(path):
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # 进程被强制终止时最后一行可能只写了一半，忽略即可
+                continue
+
+
+class RunCheckpoint:
+    # 每个运行目录包含 jobs.jsonl (任务列表，确定任务时写入一次)、rows.jsonl (逐行追加的分析结果，
+    # 也是已完成任务的权威记录) 和 manifest.json (状态、计数、高水位等少量字段，定期重写)
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.jobs_path = os.path.join(directory, "jobs.jsonl")
+        self.rows_path = os.path.join(directory, "rows.jsonl")
+        self.manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        # 旧版 manifest 直接保存任务列表和已完成列表：任务列表在下次保存时迁移到 jobs.jsonl，已完成任务以 rows.jsonl 为准
+        legacy_jobs = self.manifest.pop('jobs', None)
+        self.manifest.pop('completed', None)
+        self.job_list = list(iter_json_lines(self.jobs_path)) if os.path.exists(self.jobs_path) else legacy_jobs
+        self.completed = set()
+        self.row_count = 0
+        for row in self.iter_rows():
+            self.completed.add((row['Analyzed_Match_ID'], row['Player_ID']))
+            self.row_count += 1
+        self.rows_file = None
+        self.unsaved_rows = 0
+
+    @classmethod
+    def create(cls, config):
+        directory = os.path.join(RUNS_DIRECTORY, f"{get_job_key(config)}_{time.strftime('%Y%m%d_%H%M%S')}")
+        os.makedirs(directory, exist_ok=True)
+        checkpoint = cls(directory)
+        checkpoint.manifest = {"job_key": get_job_key(config), "status": "running", "created_at": time.time(),
+                               "config": get_job_config(config)}
+        checkpoint.save_manifest()
+        return checkpoint
+
+    @classmethod
+    def open_refresh(cls, config):
+        # 增量刷新使用固定目录 (不带时间戳)，每次刷新都在同一份结果上追加
+        job_key = f"refresh_personal_{config['account_id']}_t{config['threshold']}"
+        directory = os.path.join(RUNS_DIRECTORY, job_key)
+        os.makedirs(directory, exist_ok=True)
+        checkpoint = cls(directory)
+        if not checkpoint.manifest:
+            checkpoint.manifest = {"job_key": job_key, "created_at": time.time(),
+                                   "config": {key: config[key] for key in ('mode', 'account_id', 'threshold')},
+                                   "high_water_mark": None}
+        if checkpoint.jobs is None:
+            checkpoint.write_jobs([])
+        checkpoint.manifest['status'] = "running"
+        checkpoint.save_manifest()
+        return checkpoint
+
+    @classmethod
+    def find_resumable(cls, config):
+        # 找到相同参数、最近一次未完成的运行；目录名前缀只用于快速筛选，参数以 manifest 中保存的为准
+        if not os.path.isdir(RUNS_DIRECTORY):
+            return None
+        prefix = f"{get_job_key(config)}_"
+        job_config = get_job_config(config)
+        for name in sorted(os.listdir(RUNS_DIRECTORY), reverse=True):
+            manifest_path = os.path.join(RUNS_DIRECTORY, name, "manifest.json")
+            if name.startswith(prefix) and os.path.exists(manifest_path):
+                checkpoint = cls(os.path.join(RUNS_DIRECTORY, name))
+                if (checkpoint.manifest.get('status') != "completed"
+                        and checkpoint.manifest.get('config') == job_config):
+                    return checkpoint
+        return None
+
+    @property
+    def jobs(self):
+        return self.job_list
+
+    def write_jobs(self, jobs):
+        temp_path = f"{self.jobs_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(job, ensure_ascii=False) + "\n" for job in jobs)
+        os.replace(temp_path, self.jobs_path)
+        self.job_list = list(jobs)
+
+    def set_jobs(self, analysis_jobs):
+        self.write_jobs(analysis_jobs)
+        self.save_manifest()
+
+    @property
+    def high_water_mark(self):
+        return self.manifest.get('high_water_mark')
+
+    def add_jobs(self, new_jobs):
+        # 追加新任务并推进高水位 (已见过的最新比赛)；任务先落盘，再保存高水位
+        if self.job_list is None or not os.path.exists(self.jobs_path):
+            self.write_jobs((self.job_list or []) + new_jobs)
+        elif new_jobs:
+            truncate_partial_line(self.jobs_path)
+            with open(self.jobs_path, 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(job, ensure_ascii=False) + "\n" for job in new_jobs)
+            self.job_list.extend(new_jobs)
+        if new_jobs:
+            newest = max(new_jobs, key=lambda job: job['match_id'])
+            if not self.high_water_mark or newest['match_id'] > self.high_water_mark['match_id']:
+                self.manifest['high_water_mark'] = {"match_id": newest['match_id'],
+                                                    "start_time": newest.get('start_time')}
+        self.save_manifest()
+
+    def pending_jobs(self):
+        return [job for job in self.jobs or [] if (job['match_id'], job['player_id']) not in self.completed]
+
+    def save_manifest(self):
+        # 只重写状态和计数，任务列表与已完成任务分别在 jobs.jsonl / rows.jsonl 中，重写开销与运行规模无关
+        if self.job_list is not None and not os.path.exists(self.jobs_path):
+            self.write_jobs(self.job_list)
+        self.manifest['job_count'] = len(self.job_list) if self.job_list is not None else None
+        self.manifest['completed_count'] = self.row_count
+        self.manifest['updated_at'] = time.time()
+        write_json_atomic(self.manifest_path, self.manifest)
+        self.unsaved_rows = 0
+
+    def append(self, row):
+        if self.rows_file is None:
+            truncate_partial_line(self.rows_path)
+            self.rows_file = open(self.rows_path, 'a', encoding='utf-8')
+        self.rows_file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.rows_file.flush()
+        self.completed.add((row['Analyzed_Match_ID'], row['Player_ID']))
+        self.row_count += 1
+        self.unsaved_rows += 1
+        if self.unsaved_rows >= MANIFEST_FLUSH_ROWS:
+            os.fsync(self.rows_file.fileno())
+            self.save_manifest()
+
+    def close(self, completed=False):
+        if self.rows_file is not None:
+            self.rows_file.close()
+            self.rows_file = None
+        if completed:
+            self.manifest['status'] = "completed"
+        self.save_manifest()
+
+    def iter_rows(self):
+        return iter_json_lines(self.rows_path)
+
+    def iter_chunks(self, chunk_rows=None):
+        chunk = []
+        for row in self.iter_rows():
+            chunk.append(row)
+            if len(chunk) >= (chunk_rows or CHECKPOINT_CHUNK_ROWS):
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
 
 
 # ==============================================================================
 # 模式一 & 模式二 共享的核心分析流程
 # ==============================================================================
-def run_analysis_flow(config, player_ids_to_scan, scan_limit):
-    print(f"这个过程根据比赛的数量和样本的数量以及来计算时长, 最近30场比赛样本大概20min分析")
+def build_analysis_jobs(player_ids_to_scan, scan_limit):
     print(
-        f"\n步骤2/3：已确定 {len(player_ids_to_scan)} 位玩家样本，正在获取他们的最新 {scan_limit} 场比赛比赛并提交解析...")
+        f"\n步骤2/3：已确定 {len(player_ids_to_scan)} 位玩家样本，正在获取他们的最新 {scan_limit} 场比赛比赛...")
+    player_ids = list(player_ids_to_scan)
+    player_matches = fetch_concurrently(
+        lambda player_id: get_api_data(f"{BASE_URL}/players/{player_id}/matches?limit={scan_limit}"), player_ids)
     analysis_jobs = []
-    unique_match_ids_processed = set()
-    for i, player_id in enumerate(list(player_ids_to_scan)):
+    for player_id, matches_to_fetch in zip(player_ids, player_matches):
         # 模式1是获取1场，模式2是获取scan_count场
-        matches_to_fetch = get_api_data(f"{BASE_URL}/players/{player_id}/matches?limit={scan_limit}")
         if matches_to_fetch:
             for match in matches_to_fetch:
-                match_id = match['match_id']
-                analysis_jobs.append({'match_id': match_id, 'player_id': player_id})
-                if match_id not in unique_match_ids_processed:
-                    post_api_request(f"{BASE_URL}/request/{match_id}")
-                    unique_match_ids_processed.add(match_id)
+                analysis_jobs.append({'match_id': match['match_id'], 'player_id': player_id,
+                                      'start_time': match.get('start_time')})
+    return analysis_jobs
+
+
+def fetch_new_player_matches(player_id, high_water_mark, max_matches):
+    # 首次刷新按 scan_count 获取；之后只向前翻页到上次的最新比赛为止。返回 None 表示获取失败
+    if not high_water_mark:
+        return get_api_data(f"{BASE_URL}/players/{player_id}/matches?limit={max_matches}")
+    new_matches, offset = [], 0
+    while True:
+        page = get_api_data(f"{BASE_URL}/players/{player_id}/matches?limit={REFRESH_PAGE_SIZE}&offset={offset}")
+        if page is None:
+            # 中间某页失败时不能推进高水位，否则会漏掉这一页的比赛
+            return None
+        fresh_matches = [match for match in page if match['match_id'] > high_water_mark['match_id']]
+        new_matches.extend(fresh_matches)
+        if len(fresh_matches) < len(page) or len(page) < REFRESH_PAGE_SIZE:
+            break
+        offset += len(page)
+    if len(new_matches) > REFRESH_MAX_NEW_MATCHES:
+        # 列表按时间从新到旧排列：只保留紧接高水位的较早比赛，高水位随之只推进到这些比赛，较新的比赛不会被跳过
+        print(f"[WARNING] 自上次刷新以来共有 {len(new_matches)} 场新比赛，本次只处理最早的 {REFRESH_MAX_NEW_MATCHES} 场，"
+              f"其余 {len(new_matches) - REFRESH_MAX_NEW_MATCHES} 场将在下次刷新时获取")
+        new_matches = new_matches[-REFRESH_MAX_NEW_MATCHES:]
+    return new_matches
+
+
+def open_refresh_checkpoint(config):
+    checkpoint = RunCheckpoint.open_refresh(config)
+    high_water_mark = checkpoint.high_water_mark
+    if high_water_mark:
+        print(f"步骤1/3：增量刷新，上次记录的最新比赛为 {high_water_mark['match_id']}，只获取之后的新比赛...")
+    else:
+        print(f"步骤1/3：首次增量刷新，获取最新 {config['scan_count']} 场比赛作为基线...")
+    new_matches = fetch_new_player_matches(config['account_id'], high_water_mark, config['scan_count'])
+    if new_matches is None:
+        print("[ERROR] 获取比赛列表失败，本次只处理上次未完成的任务。")
+        new_matches = []
+    known_jobs = {(job['match_id'], job['player_id']) for job in checkpoint.jobs or []}
+    new_jobs = [{'match_id': match['match_id'], 'player_id': config['account_id'], 'start_time': match.get('start_time')}
+                for match in new_matches if (match['match_id'], config['account_id']) not in known_jobs]
+    checkpoint.add_jobs(new_jobs)
+    print(f"[INFO] 新比赛 {len(new_jobs)} 场，累计 {len(checkpoint.jobs)} 场 ({checkpoint.directory})")
+    return checkpoint
+
+
+def run_analysis_flow(config, player_ids_to_scan, scan_limit, checkpoint=None):
+    print(f"这个过程根据比赛的数量和样本的数量以及来计算时长, 并发模式下受API限流额度 ({RATE_LIMIT_PER_MINUTE} 次/分钟) 约束")
+    checkpoint = checkpoint or RunCheckpoint.create(config)
+    metrics = get_metrics()
+    if checkpoint.jobs is None:
+        with metrics.timer("dota_stage_seconds", stage="job_discovery"):
+            checkpoint.set_jobs(build_analysis_jobs(player_ids_to_scan, scan_limit))
+    analysis_jobs = checkpoint.pending_jobs()
+    if len(analysis_jobs) < len(checkpoint.jobs):
+        print(f"\n[INFO] 从检查点继续：已完成 {len(checkpoint.jobs) - len(analysis_jobs)} 个任务，"
+              f"剩余 {len(analysis_jobs)} 个 ({checkpoint.directory})")
+    unique_match_ids, seen_match_ids = [], set()
+    for job in analysis_jobs:
+        if job['match_id'] not in seen_match_ids:
+            seen_match_ids.add(job['match_id'])
+            unique_match_ids.append(job['match_id'])
+    # 缓存中已解析的比赛无需再次提交解析请求
+    match_ids_to_request = [match_id for match_id in unique_match_ids if not is_match_parsed_in_cache(match_id)]
+    with metrics.timer("dota_stage_seconds", stage="parse_requests"):
+        fetch_concurrently(lambda match_id: post_api_request(f"{BASE_URL}/request/{match_id}"), match_ids_to_request)
     print(f"\n--- 所有解析请求已提交，一共有{len(analysis_jobs)} 个不重复且公开的比赛数据 ---")
     print(f"\n步骤3/3：开始获取并分析 {len(analysis_jobs)} 个比赛的数据...")
-    results = []
     advantage_col_name = f"First_Team_to_{config['threshold']}_Adv"
-    heroes_map = {h['id']: h['localized_name'] for h in get_api_data(f"{BASE_URL}/heroes")}
-    for i, job in enumerate(analysis_jobs):
-        match_id, player_id = job['match_id'], job['player_id']
-        print(f"  分析比赛 {i + 1}/{len(analysis_jobs)} (Match: {match_id}, Player: {player_id})")
-        match_details = fetch_and_analyze_match(match_id)
-        row_data = {"Player_ID": player_id, "Analyzed_Match_ID": match_id}
-        if not match_details:
-            row_data["Analysis_Status"] = "经济数据缺失"
+    heroes_map = get_heroes_map()
+    # 同一场比赛只下载一次，多个玩家共享同一份比赛详情；已就绪的比赛先分析，未解析的比赛在后台等待
+    job_indexes_by_match = {}
+    for index, job in enumerate(analysis_jobs):
+        job_indexes_by_match.setdefault(job['match_id'], []).append(index)
+    dataset_builder = MatchDatasetBuilder()
+    analysed_count, parsed_count = 0, 0
+    try:
+        # closing 保证中断时立即关闭生成器并取消排队中的比赛请求，而不是等到进程退出
+        with metrics.timer("dota_stage_seconds", stage="match_analysis"), \
+                closing(iter_parsed_matches(unique_match_ids)) as parsed_matches:
+            for match_id, match_details in parsed_matches:
+                if match_details:
+                    parsed_count += 1
+                    # 只保留经济曲线和少量字段写入列式数据集，完整的比赛 JSON 不再长期驻留内存
+                    dataset_builder.add(match_details)
+                for index in job_indexes_by_match[match_id]:
+                    player_id = analysis_jobs[index]['player_id']
+                    analysed_count += 1
+                    print(f"  分析比赛 {analysed_count}/{len(analysis_jobs)} (Match: {match_id}, Player: {player_id})")
+                    # 每完成一行立即追加写入检查点
+                    checkpoint.append(analyze_match_for_player(match_details, match_id, player_id, heroes_map, config,
+                                                               advantage_col_name))
+    finally:
+        # 即使中途中断，也保存已完成的进度和已下载的经济曲线
+        checkpoint.close(completed=not checkpoint.pending_jobs())
+        with metrics.timer("dota_stage_seconds", stage="dataset_update"):
+            dataset = update_match_dataset(dataset_builder.build())
+    metrics.inc("dota_matches_total", len(unique_match_ids))
+    metrics.inc("dota_matches_parsed_total", parsed_count)
+    if unique_match_ids:
+        print(f"\n[INFO] 比赛解析成功率: {parsed_count}/{len(unique_match_ids)} "
+              f"({parsed_count / len(unique_match_ids) * 100:.1f}%)")
+    print(f"[INFO] 列式数据集已更新: {os.path.abspath(DATASET_DIRECTORY)} (共 {len(dataset)} 场比赛)")
+    print(f"[INFO] 分析结果检查点: {os.path.abspath(checkpoint.rows_path)} (共 {checkpoint.row_count} 行)")
+    return checkpoint, advantage_col_name, dataset
+
+# ==============================================================================
+# 共享任务队列：多个 worker 进程/机器协作采集，结果写入同一个 SQLite 结果库
+# ==============================================================================
+class WorkQueue:
+    # jobs 表保存 (match_id, player_id) 任务及租约；results 表保存逐行结果；matches 表保存精简的比赛数据
+    # 报告阶段使用与 RunCheckpoint 相同的读取接口 (row_count / iter_chunks / manifest / save_manifest)
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS jobs (match_id INTEGER NOT NULL, player_id INTEGER NOT NULL, "
+                          "start_time INTEGER, status TEXT NOT NULL DEFAULT 'pending', lease_owner TEXT, "
+                          "lease_expires_at REAL, attempts INTEGER NOT NULL DEFAULT 0, "
+                          "PRIMARY KEY (match_id, player_id))")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, lease_expires_at)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS results (match_id INTEGER NOT NULL, player_id INTEGER NOT NULL, "
+                          "row TEXT NOT NULL, worker TEXT, finished_at REAL, PRIMARY KEY (match_id, player_id))")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS matches (match_id INTEGER PRIMARY KEY, payload BLOB NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.manifest = self.get_meta('manifest') or {}
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE 立即获取写锁，多个 worker 同时租用任务时不会拿到同一批任务
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                          (key, json.dumps(value, ensure_ascii=False)))
+
+    @property
+    def config(self):
+        return self.get_meta('config')
+
+    def add_jobs(self, config, analysis_jobs):
+        with self.transaction() as conn:
+            self.set_meta('config', config)
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO jobs (match_id, player_id, start_time) VALUES (?, ?, ?)",
+                             [(job['match_id'], job['player_id'], job.get('start_time')) for job in analysis_jobs])
+            return conn.total_changes - before
+
+    def lease(self, worker_id, match_limit=None):
+        # 以比赛为单位租用，同一场比赛的多个玩家任务由同一个 worker 处理，比赛详情只下载一次
+        now = time.time()
+        with self.transaction() as conn:
+            match_ids = [row[0] for row in conn.execute(
+                "SELECT DISTINCT match_id FROM jobs WHERE status = 'pending' "
+                "OR (status = 'leased' AND lease_expires_at < ?) LIMIT ?", (now, match_limit or QUEUE_LEASE_BATCH))]
+            if not match_ids:
+                return []
+            placeholders = ",".join("?" * len(match_ids))
+            # 与上面的查询条件一致：其他 worker 持有且尚未过期的任务 (例如重复 init 时新增到同一场比赛的任务) 不能被抢走
+            conn.execute(f"UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires_at = ?, "
+                         f"attempts = attempts + 1 WHERE (status = 'pending' OR (status = 'leased' AND "
+                         f"lease_expires_at < ?)) AND match_id IN ({placeholders})",
+                         [worker_id, now + QUEUE_LEASE_SECONDS, now] + match_ids)
+            return [{'match_id': match_id, 'player_id': player_id, 'start_time': start_time}
+                    for match_id, player_id, start_time in conn.execute(
+                        f"SELECT match_id, player_id, start_time FROM jobs WHERE lease_owner = ? AND status = 'leased' "
+                        f"AND match_id IN ({placeholders})", [worker_id] + match_ids)]
+
+    def complete(self, worker_id, rows, match_details=None):
+        # 结果只保留第一份 (INSERT OR IGNORE)，租约过期后被重复处理的任务不会产生重复行，行的顺序也保持稳定
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany("INSERT OR IGNORE INTO results (match_id, player_id, row, worker, finished_at) "
+                             "VALUES (?, ?, ?, ?, ?)",
+                             [(row['Analyzed_Match_ID'], row['Player_ID'], json.dumps(row, ensure_ascii=False),
+                               worker_id, now) for row in rows])
+            if match_details:
+                payload = zlib.compress(json.dumps(compact_match_record(match_details), separators=(',', ':'))
+                                        .encode('utf-8'))
+                conn.execute("INSERT OR IGNORE INTO matches (match_id, payload) VALUES (?, ?)",
+                             (match_details['match_id'], payload))
+            conn.executemany("UPDATE jobs SET status = 'done', lease_owner = ? WHERE match_id = ? AND player_id = ?",
+                             [(worker_id, row['Analyzed_Match_ID'], row['Player_ID']) for row in rows])
+            # 顺便续租该 worker 手上其余的任务，长时间等待解析的批次不会被误判为失效
+            conn.execute("UPDATE jobs SET lease_expires_at = ? WHERE lease_owner = ? AND status = 'leased'",
+                         (now + QUEUE_LEASE_SECONDS, worker_id))
+
+    def release(self, worker_id):
+        with self.transaction() as conn:
+            conn.execute("UPDATE jobs SET status = 'pending', lease_owner = NULL, lease_expires_at = NULL "
+                         "WHERE lease_owner = ? AND status = 'leased'", (worker_id,))
+
+    def counts(self):
+        counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in ('pending', 'leased', 'done')}
+
+    def worker_counts(self):
+        return self.conn.execute("SELECT worker, COUNT(*) FROM results GROUP BY worker ORDER BY 2 DESC").fetchall()
+
+    @property
+    def row_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def save_manifest(self):
+        self.set_meta('manifest', self.manifest)
+
+    def iter_rows(self):
+        # 按写入顺序 (rowid) 读取，增量报告依赖行顺序稳定
+        for (row,) in self.conn.execute("SELECT row FROM results ORDER BY rowid"):
+            yield json.loads(row)
+
+    def iter_chunks(self, chunk_rows=None):
+        chunk = []
+        for row in self.iter_rows():
+            chunk.append(row)
+            if len(chunk) >= (chunk_rows or CHECKPOINT_CHUNK_ROWS):
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def build_match_dataset(self):
+        builder = MatchDatasetBuilder()
+        for (payload,) in self.conn.execute("SELECT payload FROM matches"):
+            builder.add(json.loads(zlib.decompress(payload)))
+        return builder.build()
+
+    def close(self):
+        self.conn.close()
+
+
+def get_default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def init_queue(queue_path, config):
+    # 协调者：收集任务列表写入共享队列，之后由任意数量的 worker 领取
+    queue = WorkQueue(queue_path)
+    try:
+        if config['mode'] == '1':
+            analysis_jobs = discover_sample_jobs(config)
         else:
-            player_data = next((p for p in match_details.get('players', []) if p.get('account_id') == player_id), None)
-            if player_data:
-                is_radiant = player_data.get('isRadiant', True)
-                radiant_win = match_details.get('radiant_win', False)
-                won_match = 1 if (is_radiant and radiant_win) or (not is_radiant and not radiant_win) else 0
-                row_data.update(
-                    {"Analysis_Status": "成功", "Medal": RANK_TIERS.get(player_data.get('rank_tier'), "未定级"),
-                     "Hero": heroes_map.get(player_data.get('hero_id'), "未知"),
-                     "Role": LANE_ROLES.get(player_data.get('lane_role'), f"未知({player_data.get('lane_role')})"),
-                     "Won_Match": won_match,
-                     advantage_col_name: get_first_to_advantage_threshold(match_details, is_radiant,
-                                                                          config['threshold'])})
-            else:
-                row_data["Analysis_Status"] = "未找到玩家数据"
-        results.append(row_data)
-    return pd.DataFrame(results), advantage_col_name
+            analysis_jobs = build_analysis_jobs({config['account_id']}, scan_limit=config['scan_count'])
+        added = queue.add_jobs(config, analysis_jobs)
+        print(f"[SUCCESS] 已向共享队列 {os.path.abspath(queue_path)} 添加 {added} 个新任务，当前状态: {queue.counts()}")
+    finally:
+        queue.close()
+
+
+def run_queue_worker(queue_path, worker_id=None):
+    worker_id = worker_id or get_default_worker_id()
+    queue = WorkQueue(queue_path)
+    config = queue.config
+    if config is None:
+        print(f"[ERROR] 队列 {queue_path} 尚未初始化，请先使用 --queue-action init 添加任务。")
+        queue.close()
+        return 2
+    advantage_col_name = f"First_Team_to_{config['threshold']}_Adv"
+    heroes_map = get_heroes_map()
+    processed = 0
+    print(f"--- Worker {worker_id} 开始从共享队列领取任务: {os.path.abspath(queue_path)} ---")
+    try:
+        while True:
+            leased_jobs = queue.lease(worker_id)
+            if not leased_jobs:
+                counts = queue.counts()
+                if not counts['pending'] and not counts['leased']:
+                    break
+                # 其余任务正被其他 worker 处理；等待它们完成，或等租约过期后接手
+                print(f"  > 暂无可领取的任务 ({counts})，{QUEUE_IDLE_POLL_SECONDS} 秒后重试...")
+                time.sleep(QUEUE_IDLE_POLL_SECONDS)
+                continue
+            players_by_match = {}
+            for job in leased_jobs:
+                players_by_match.setdefault(job['match_id'], []).append(job['player_id'])
+            match_ids_to_request = [match_id for match_id in players_by_match if not is_match_parsed_in_cache(match_id)]
+            fetch_concurrently(lambda match_id: post_api_request(f"{BASE_URL}/request/{match_id}"), match_ids_to_request)
+            with closing(iter_parsed_matches(list(players_by_match))) as parsed_matches:
+                for match_id, match_details in parsed_matches:
+                    rows = [analyze_match_for_player(match_details, match_id, player_id, heroes_map, config,
+                                                     advantage_col_name) for player_id in players_by_match[match_id]]
+                    queue.complete(worker_id, rows, match_details)
+                    processed += len(rows)
+            print(f"  > Worker {worker_id} 已完成 {processed} 个任务，队列状态: {queue.counts()}")
+    except KeyboardInterrupt:
+        # 主动归还未完成的租约，其他 worker 无需等待过期即可接手
+        queue.release(worker_id)
+        print(f"\n[INFO] Worker {worker_id} 已中断，未完成的任务已归还队列。")
+        return 130
+    finally:
+        queue.close()
+    print(f"[SUCCESS] 队列已全部完成，Worker {worker_id} 共处理 {processed} 个任务。")
+    return 0
+
+
+def report_queue(queue_path, overrides=None):
+    # 单次汇总：所有 worker 的结果和比赛数据合并后生成一份报告
+    queue = WorkQueue(queue_path)
+    try:
+        if queue.config is None:
+            print(f"[ERROR] 队列 {queue_path} 尚未初始化。")
+            return 2
+        config = {**queue.config, **(overrides or {})}
+        counts = queue.counts()
+        if counts['pending'] or counts['leased']:
+            print(f"[WARNING] 队列尚未全部完成 ({counts})，报告只包含已完成的结果。")
+        for worker, count in queue.worker_counts():
+            print(f"  Worker {worker}: {count} 行")
+        if not (config.get('report', True) or config.get('plots', True)):
+            save_rows_csv(queue, config)
+            return 0
+        dataset = update_match_dataset(queue.build_match_dataset())
+        generate_report_and_plots(queue, f"First_Team_to_{config['threshold']}_Adv", config, dataset)
+        wait_for_charts()
+    finally:
+        queue.close()
+    return 0
 
 # ==============================================================================
-# 最终步骤：生成报告和图表
+# 图表渲染 (先准备聚合数据，再在进程池中以 Agg 后端并行绘制)
 # ==============================================================================
-def generate_report_and_plots(df, advantage_col_name, config):
-    print("\n--- 分析完成，正在生成最终报告和图表 ---")
-    if df is None or df.empty:
-        print("没有收集到有效数据，无法生成报告。")
-        return
-    if advantage_col_name not in df.columns:
-        print(f"\n[ERROR] 关键数据列 '{advantage_col_name}' 不存在。")
-        print("这通常意味着在所有分析的比赛中，都未能获取到有效的经济数据。")
-        output_excel_file = f"dota_analysis_report_(partial)_{time.strftime('%Y%m%d_%H%M')}.xlsx"
-        df.to_excel(output_excel_file, index=False, engine='openpyxl')
-        print(f"\n已保存部分分析报告至: {os.path.abspath(output_excel_file)}")
+_chart_executor = None
+_chart_renderer_ready = False
+_pending_charts = []
+
+
+def init_chart_renderer():
+    # 每个渲染进程只初始化一次：无界面后端 + 中文字体
+    global _chart_renderer_ready
+    if _chart_renderer_ready:
         return
+    import matplotlib
+    matplotlib.use('Agg')
+    set_chinese_font(verbose=False)
+    _chart_renderer_ready = True
 
-    valid_df = df[df[advantage_col_name].isin([0, 1])].copy()
-    valid_df['Won_Match'] = pd.to_numeric(valid_df['Won_Match'])
-    valid_df[advantage_col_name] = pd.to_numeric(valid_df[advantage_col_name])
 
-    mode = config['mode']
-    threshold = config['threshold']
+def render_pie_chart(spec, plt, sns):
+    plt.figure(figsize=(8, 8))
+    wedgeprops = {'edgecolor': 'white', 'linewidth': 2} if spec.get('white_edges', True) else None
+    plt.pie(spec['values'], labels=spec['labels'], autopct='%1.1f%%', startangle=90, colors=spec['colors'],
+            wedgeprops=wedgeprops, textprops={'fontsize': 14})
+    plt.title(spec['title'], fontsize=16)
+    plt.figtext(0.5, 0.02, spec['formula_text'], ha="center", fontsize=11,
+                bbox={"facecolor": "gray", "alpha": 0.2, "pad": 5})
 
-    # --- 核心统计计算 ---
-    summary_stats = {"分析模式": "抽样调查" if mode == '1' else "个人战绩", "经济领先阈值": threshold}
-    first_to_adv_games = pd.DataFrame()
 
-    if not valid_df.empty:
-        first_to_adv_games = valid_df[valid_df[advantage_col_name] == 1]
-        summary_stats["总有效分析样本数"] = len(valid_df)
-        summary_stats[f"率先达到{threshold}G领先的样本数"] = len(first_to_adv_games)
+def render_rank_bar_chart(spec, plt, sns):
+    plt.figure(figsize=(12, 7))
+    win_rates = [rate * 100 for rate in spec['win_rates']]
+    ax = sns.barplot(x=spec['categories'], y=win_rates, hue=spec['categories'], palette="viridis", legend=False)
+    ax.set_title(spec['title'], fontsize=16)
+    ax.set_xlabel('玩家段位 (Rank Group)', fontsize=12)
+    ax.set_ylabel('胜率 (%)', fontsize=12)
+    ax.set_ylim(0, 105)
+    plt.xticks(rotation=0)
+    if spec.get('ci_low'):
+        errors = [[max(rate - low * 100, 0) for rate, low in zip(win_rates, spec['ci_low'])],
+                  [max(high * 100 - rate, 0) for rate, high in zip(win_rates, spec['ci_high'])]]
+        ax.errorbar(range(len(win_rates)), win_rates, yerr=errors, fmt='none', ecolor='#333333', capsize=5)
+    plt.tight_layout()
+    for i, p in enumerate(ax.patches):
+        height = p.get_height()
+        label_text = f"{height:.1f}% | {spec['counts'][i]}"
+        ax.annotate(label_text, (p.get_x() + p.get_width() / 2., height), ha='center', va='center',
+                    xytext=(0, 5), textcoords='offset points', fontsize=11)
 
-        if not first_to_adv_games.empty:
-            win_rate = first_to_adv_games['Won_Match'].mean() * 100
-            summary_stats[f"率先达到{threshold}G领先后胜率"] = f"{win_rate:.2f}%"
-        else:
-            summary_stats[f"率先达到{threshold}G领先后胜率"] = "0% (无此类样本)"
 
-        comeback_possible_games = valid_df[valid_df[advantage_col_name] == 0]
-        if not comeback_possible_games.empty:
-            comeback_wins = comeback_possible_games['Won_Match'].sum()
-            total_comeback_possible = len(comeback_possible_games)
-            comeback_win_rate = (comeback_wins / total_comeback_possible) * 100
-            summary_stats["翻盘成功率 (未率先达到领先)"] = f"{comeback_win_rate:.2f}%"
-        else:
-            summary_stats["翻盘成功率 (未率先达到领先)"] = "N/A (无劣势对局样本)"
-    else:
-        summary_stats["说明"] = "未能找到足够的数据进行统计"
+def render_threshold_curve_chart(spec, plt, sns):
+    fig, ax = plt.subplots(figsize=(12, 7))
+    ax.plot(spec['thresholds'], spec['lead_win_rates'], marker='o', color='#1f77b4', label='率先领先后胜率')
+    ax.plot(spec['thresholds'], spec['comeback_rates'], marker='s', color='#ff7f0e', label='翻盘成功率')
+    ax.axvline(spec['threshold'], color='gray', linestyle='--', linewidth=1)
+    ax.set_title(spec['title'], fontsize=16)
+    ax.set_xlabel('经济领先阈值 (G)', fontsize=12)
+    ax.set_ylabel('胜率 (%)', fontsize=12)
+    ax.set_ylim(0, 105)
+    for threshold, win_rate, minute in zip(spec['thresholds'], spec['lead_win_rates'], spec['median_minutes']):
+        if minute is not None and win_rate is not None:
+            ax.annotate(f"{minute:.0f}min", (threshold, win_rate), xytext=(0, 8), textcoords='offset points',
+                        ha='center', fontsize=9)
+    ax.legend(loc='lower right')
+    plt.figtext(0.5, 0.01, "标注为首次达到该阈值的中位分钟数", ha="center", fontsize=11,
+                bbox={"facecolor": "gray", "alpha": 0.2, "pad": 5})
+    plt.tight_layout(rect=(0, 0.04, 1, 1))
 
-    summary_df = pd.DataFrame(list(summary_stats.items()), columns=['统计项', '结果'])
-    output_excel_file = f"dota_analysis_report_{'sample' if mode == '1' else 'personal'}_{time.strftime('%Y%m%d_%H%M')}.xlsx"
-    with pd.ExcelWriter(output_excel_file, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='详细数据 (Raw Data)', index=False)
-        summary_df.to_excel(writer, sheet_name='统计概要 (Summary)', index=False)
-    print(f"\n[SUCCESS] 最终报告已保存至: {os.path.abspath(output_excel_file)}")
 
-    # --- 绘图 ---
-    if not os.path.exists(OUTPUT_PLOT_DIRECTORY): os.makedirs(OUTPUT_PLOT_DIRECTORY)
-    set_chinese_font()
+CHART_RENDERERS = {"pie": render_pie_chart, "rank_bar": render_rank_bar_chart,
+                   "threshold_curve": render_threshold_curve_chart}
 
-    if valid_df.empty:
-        print("[INFO] 无有效数据，跳过绘图步骤。")
+
+def render_chart(spec):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    CHART_RENDERERS[spec['kind']](spec, plt, sns)
+    plt.savefig(spec['path'])
+    plt.close('all')
+    return spec['path']
+
+
+def get_chart_executor():
+    global _chart_executor
+    if _chart_executor is None:
+        workers = PLOT_WORKERS or min(4, os.cpu_count() or 1)
+        # 使用 spawn 保证各平台行为一致，也避免在仍有网络线程时 fork
+        _chart_executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                              initializer=init_chart_renderer)
+    return _chart_executor
+
+
+def submit_charts(specs):
+    # 并行模式下只提交任务立即返回，批处理中的下一个任务可以同时开始抓取数据
+    if not specs:
+        return
+    if PLOT_WORKERS == 1:
+        init_chart_renderer()
+        for spec in specs:
+            render_chart(spec)
+            print(f"[SUCCESS] {spec['name']} 已保存至: {spec['path']}")
         return
+    executor = get_chart_executor()
+    _pending_charts.extend((spec, executor.submit(render_chart, spec)) for spec in specs)
+
+
+def wait_for_charts():
+    global _chart_executor
+    # 只在确实有图表待完成时记录渲染阶段，--no-plots / --data-only 时不产生空的 plot_render 记录
+    if _pending_charts:
+        with get_metrics().timer("dota_stage_seconds", stage="plot_render"):
+            for spec, future in _pending_charts:
+                try:
+                    future.result()
+                    print(f"[SUCCESS] {spec['name']} 已保存至: {spec['path']}")
+                except Exception as e:
+                    print(f"[WARNING] {spec['name']} 生成失败: {e}")
+        _pending_charts.clear()
+    if _chart_executor is not None:
+        _chart_executor.shutdown()
+        _chart_executor = None
+
+
+def build_pie_spec(name, file_stem, counts, labels, colors, title, formula_text, white_edges=True):
+    # 扇区顺序与 value_counts 一致：数量多的在前
+    keys = sorted(counts, key=lambda key: -counts[key])
+    return {"kind": "pie", "name": name, "file_stem": file_stem, "values": [int(counts[key]) for key in keys],
+            "labels": [labels[key] for key in keys], "colors": colors, "title": title, "formula_text": formula_text,
+            "white_edges": white_edges}
+
+
+def prepare_chart_specs(accumulator, sweep_df, config):
+    mode, threshold = config['mode'], config['threshold']
+    outcomes = accumulator.outcomes
+    total = accumulator.valid_count
+    specs = []
 
     # --- 图1: 总局数构成图 ---
-    print("正在生成图表1：总对局构成分析...")
-    total_composition = valid_df[advantage_col_name].value_counts()
-    if 1 not in total_composition: total_composition[1] = 0
-    if 0 not in total_composition: total_composition[0] = 0
-    labels_total = {1: f'经济优势局数\n({total_composition[1]} 场)', 0: f'经济劣势局数\n({total_composition[0]} 场)'}
-    plt.figure(figsize=(8, 8));
-    plt.pie(total_composition, labels=[labels_total[i] for i in total_composition.index], autopct='%1.1f%%',
-            startangle=90, colors=['#87CEFA', '#FFB6C1'], wedgeprops={'edgecolor': 'white', 'linewidth': 2},
-            textprops={'fontsize': 14})
-    plt.title(f'总局数构成分析 (总样本: {len(valid_df)} 场)', fontsize=16)
-    formula_text = f"计算公式: 总局数 ({len(valid_df)}) = 经济优势局数 ({total_composition[1]}) + 经济劣势局数 ({total_composition[0]})"
-    plt.figtext(0.5, 0.02, formula_text, ha="center", fontsize=11, bbox={"facecolor": "gray", "alpha": 0.2, "pad": 5})
-    chart1_path = os.path.join(OUTPUT_PLOT_DIRECTORY, f"01_总对局构成_{time.strftime('%Y%m%d_%H%M')}.png")
-    plt.savefig(chart1_path);
-    plt.close()
-    print(f"[SUCCESS] 图表1 (总对局构成分析) 已保存至: {chart1_path}")
+    total_composition = {1: int(outcomes[1].sum()), 0: int(outcomes[0].sum())}
+    specs.append(build_pie_spec(
+        "图表1 (总对局构成分析)", "01_总对局构成", total_composition,
+        {1: f'经济优势局数\n({total_composition[1]} 场)', 0: f'经济劣势局数\n({total_composition[0]} 场)'},
+        ['#87CEFA', '#FFB6C1'], f'总局数构成分析 (总样本: {total} 场)',
+        f"计算公式: 总局数 ({total}) = 经济优势局数 ({total_composition[1]}) + 经济劣势局数 ({total_composition[0]})"))
 
     # --- 图2: 胜利失败占比图 ---
-    print("正在生成图表2：总对局胜负占比...")
-    win_loss_total = valid_df['Won_Match'].value_counts()
-    if 1 not in win_loss_total: win_loss_total[1] = 0
-    if 0 not in win_loss_total: win_loss_total[0] = 0
-    labels_win_loss = {1: f'胜利\n({win_loss_total[1]} 场)', 0: f'失败\n({win_loss_total[0]} 场)'}
-    plt.figure(figsize=(8, 8));
-    plt.pie(win_loss_total, labels=[labels_win_loss[i] for i in win_loss_total.index], autopct='%1.1f%%', startangle=90,
-            colors=['#90EE90', '#F08080'], wedgeprops={'edgecolor': 'white', 'linewidth': 2},
-            textprops={'fontsize': 14})
-    plt.title(f'总对局胜负占比 (总样本: {len(valid_df)} 场)', fontsize=16)
-    win_rate_percent = (win_loss_total[1] / len(valid_df)) * 100 if len(valid_df) > 0 else 0
-    formula_text = f"计算公式: 胜率 ({win_rate_percent:.1f}%) = 胜利的总局数 ({win_loss_total[1]}) / 总局数 ({len(valid_df)})"
-    plt.figtext(0.5, 0.02, formula_text, ha="center", fontsize=11, bbox={"facecolor": "gray", "alpha": 0.2, "pad": 5})
-    chart2_path = os.path.join(OUTPUT_PLOT_DIRECTORY, f"02_总对局胜负占比_{time.strftime('%Y%m%d_%H%M')}.png")
-    plt.savefig(chart2_path);
-    plt.close()
-    print(f"[SUCCESS] 图表2 (总对局胜负占比) 已保存至: {chart2_path}")
+    win_loss_total = {1: int(outcomes[:, 1].sum()), 0: int(outcomes[:, 0].sum())}
+    win_rate_percent = (win_loss_total[1] / total) * 100 if total > 0 else 0
+    specs.append(build_pie_spec(
+        "图表2 (总对局胜负占比)", "02_总对局胜负占比", win_loss_total,
+        {1: f'胜利\n({win_loss_total[1]} 场)', 0: f'失败\n({win_loss_total[0]} 场)'},
+        ['#90EE90', '#F08080'], f'总对局胜负占比 (总样本: {total} 场)',
+        f"计算公式: 胜率 ({win_rate_percent:.1f}%) = 胜利的总局数 ({win_loss_total[1]}) / 总局数 ({total})"))
 
     # --- 图3: 经济优势局结果分布图 ---
-    print("正在生成图表3：经济优势局结果分布...")
-    if not first_to_adv_games.empty:
-        lead_win_loss_counts = first_to_adv_games['Won_Match'].value_counts()
-        if 1 not in lead_win_loss_counts: lead_win_loss_counts[1] = 0
-        if 0 not in lead_win_loss_counts: lead_win_loss_counts[0] = 0
-        labels_lead = {1: f'经济优势获胜\n({lead_win_loss_counts[1]} 场)',
-                       0: f'经济优势被翻盘\n({lead_win_loss_counts[0]} 场)'}
-        plt.figure(figsize=(8, 8));
-        plt.pie(lead_win_loss_counts, labels=[labels_lead[i] for i in lead_win_loss_counts.index], autopct='%1.1f%%',
-                startangle=90, colors=['#90EE90', '#FFB6C1'], wedgeprops={'edgecolor': 'white', 'linewidth': 2},
-                textprops={'fontsize': 14})
-        plt.title(f'率先达到 {threshold}G 经济领先后比赛结果分布', fontsize=16)
-        lead_win_rate_percent = (lead_win_loss_counts[1] / len(first_to_adv_games)) * 100 if len(
-            first_to_adv_games) > 0 else 0
-        formula_text = f"计算公式: 领先致胜率 ({lead_win_rate_percent:.1f}%) = 经济优势获胜 ({lead_win_loss_counts[1]}) / 经济优势局数 ({len(first_to_adv_games)})"
-        plt.figtext(0.5, 0.02, formula_text, ha="center", fontsize=11,
-                    bbox={"facecolor": "gray", "alpha": 0.2, "pad": 5})
-        chart3_path = os.path.join(OUTPUT_PLOT_DIRECTORY, f"03_经济优势胜负_{time.strftime('%Y%m%d_%H%M')}.png")
-        plt.savefig(chart3_path);
-        plt.close()
-        print(f"[SUCCESS] 图表3 (经济优势局结果) 已保存至: {chart3_path}")
+    lead_total = total_composition[1]
+    if lead_total:
+        lead_counts = {1: int(outcomes[1][1]), 0: int(outcomes[1][0])}
+        lead_win_rate_percent = lead_counts[1] / lead_total * 100
+        specs.append(build_pie_spec(
+            "图表3 (经济优势局结果)", "03_经济优势胜负", lead_counts,
+            {1: f'经济优势获胜\n({lead_counts[1]} 场)', 0: f'经济优势被翻盘\n({lead_counts[0]} 场)'},
+            ['#90EE90', '#FFB6C1'], f'率先达到 {threshold}G 经济领先后比赛结果分布',
+            f"计算公式: 领先致胜率 ({lead_win_rate_percent:.1f}%) = 经济优势获胜 ({lead_counts[1]}) / 经济优势局数 ({lead_total})"))
 
     # --- 图4: 经济劣势局结果分布图 ---
-    print("正在生成图表4：经济劣势局结果分布...")
-    disadvantage_games_df = valid_df[valid_df[advantage_col_name] == 0]
-    if not disadvantage_games_df.empty:
-        comeback_distribution = disadvantage_games_df['Won_Match'].value_counts()
-        if 1 not in comeback_distribution: comeback_distribution[1] = 0
-        if 0 not in comeback_distribution: comeback_distribution[0] = 0
-        labels_comeback = {1: f'经济劣势获胜 (翻盘)\n({comeback_distribution[1]} 场)',
-                           0: f'经济劣势失败\n({comeback_distribution[0]} 场)'}
-        plt.figure(figsize=(8, 8));
-        plt.pie(comeback_distribution, labels=[labels_comeback[i] for i in comeback_distribution.index],
-                autopct='%1.1f%%', startangle=90, colors=['#FFD700', '#A9A9A9'],
-                wedgeprops={'edgecolor': 'white', 'linewidth': 2}, textprops={'fontsize': 14})
-        plt.title(f'经济劣势局结果分布 (总样本: {len(disadvantage_games_df)} 场)', fontsize=16)
-        comeback_rate_percent = (comeback_distribution[1] / len(disadvantage_games_df)) * 100 if len(
-            disadvantage_games_df) > 0 else 0
-        formula_text = f"计算公式: 翻盘概率 ({comeback_rate_percent:.1f}%) = 经济劣势获胜 ({comeback_distribution[1]}) / 经济劣势局数 ({len(disadvantage_games_df)})"
-        plt.figtext(0.5, 0.02, formula_text, ha="center", fontsize=11,
-                    bbox={"facecolor": "gray", "alpha": 0.2, "pad": 5})
-        chart4_path = os.path.join(OUTPUT_PLOT_DIRECTORY,
-                                   f"04_经济劣势胜负_{time.strftime('%Y%m%d_%H%M')}.png")
-        plt.savefig(chart4_path);
-        plt.close()
-        print(f"[SUCCESS] 图表4 (经济劣势局结果) 已保存至: {chart4_path}")
+    disadvantage_total = total_composition[0]
+    if disadvantage_total:
+        comeback_counts = {1: int(outcomes[0][1]), 0: int(outcomes[0][0])}
+        comeback_rate_percent = comeback_counts[1] / disadvantage_total * 100
+        specs.append(build_pie_spec(
+            "图表4 (经济劣势局结果)", "04_经济劣势胜负", comeback_counts,
+            {1: f'经济劣势获胜 (翻盘)\n({comeback_counts[1]} 场)', 0: f'经济劣势失败\n({comeback_counts[0]} 场)'},
+            ['#FFD700', '#A9A9A9'], f'经济劣势局结果分布 (总样本: {disadvantage_total} 场)',
+            f"计算公式: 翻盘概率 ({comeback_rate_percent:.1f}%) = 经济劣势获胜 ({comeback_counts[1]}) / 经济劣势局数 ({disadvantage_total})"))
 
     # --- 图5: 胜利组成图 ---
-    print("正在生成图表5：胜利组成分析...")
-    wins_df = valid_df[valid_df['Won_Match'] == 1]
-    if not wins_df.empty:
-        win_composition = wins_df[advantage_col_name].value_counts()
-        if 1 not in win_composition: win_composition[1] = 0
-        if 0 not in win_composition: win_composition[0] = 0
-        labels = {1: f'领先致胜', 0: f'翻盘获胜'}
-        plt.figure(figsize=(8, 8));
-        plt.pie(win_composition, labels=[labels[i] for i in win_composition.index], autopct='%1.1f%%', startangle=90,
-                colors=['#87CEFA', '#FFD700'], textprops={'fontsize': 14})
-        plt.title(f'所有胜利对局的组成分析 (总胜场: {len(wins_df)})', fontsize=16)
-        lead_wins = win_composition[1]
-        comeback_wins = win_composition[0]
-        formula_text = f"计算公式: 总胜场 ({len(wins_df)}) = 领先致胜 ({lead_wins}) + 翻盘获胜 ({comeback_wins})"
-        plt.figtext(0.5, 0.02, formula_text, ha="center", fontsize=11,
-                    bbox={"facecolor": "gray", "alpha": 0.2, "pad": 5})
-        chart5_path = os.path.join(OUTPUT_PLOT_DIRECTORY, f"05_胜利组成_{time.strftime('%Y%m%d_%H%M')}.png")
-        plt.savefig(chart5_path);
-        plt.close()
-        print(f"[SUCCESS] 图表5 (胜利组成分析) 已保存至: {chart5_path}")
+    wins_total = win_loss_total[1]
+    if wins_total:
+        win_composition = {1: int(outcomes[1][1]), 0: int(outcomes[0][1])}
+        specs.append(build_pie_spec(
+            "图表5 (胜利组成分析)", "05_胜利组成", win_composition, {1: '领先致胜', 0: '翻盘获胜'},
+            ['#87CEFA', '#FFD700'], f'所有胜利对局的组成分析 (总胜场: {wins_total})',
+            f"计算公式: 总胜场 ({wins_total}) = 领先致胜 ({win_composition[1]}) + 翻盘获胜 ({win_composition[0]})",
+            white_edges=False))
 
     # --- 图6: 按段位分析柱状图 ---
-    if mode == '1' and 'Medal' in valid_df.columns and valid_df['Medal'].notna().any():
-        print("正在生成图表6：按段位分析的胜率柱状图...")
-        valid_df['Rank_Group'] = valid_df['Medal'].apply(lambda x: str(x).split(' ')[0])
-        first_adv_df_for_rank = valid_df[valid_df[advantage_col_name] == 1]
-        rank_analysis = first_adv_df_for_rank.groupby('Rank_Group')['Won_Match'].agg(['mean', 'count'])
-        if not rank_analysis.empty:
-            rank_order = ["冠绝", "超凡", "万古", "传奇", "统帅", "中军", "卫士", "先锋", "未定级"]
-            ordered_index = [rank for rank in rank_order if rank in rank_analysis.index]
-            rank_analysis = rank_analysis.reindex(ordered_index)
-            plt.figure(figsize=(12, 7))
-            ax = sns.barplot(x=rank_analysis.index, y=rank_analysis['mean'] * 100, hue=rank_analysis.index,
-                             palette="viridis", legend=False)
-            ax.set_title(f'各段位下 率先达到 {threshold}G 经济领先后胜率', fontsize=16)
-            ax.set_xlabel('玩家段位 (Rank Group)', fontsize=12);
-            ax.set_ylabel('胜率 (%)', fontsize=12);
-            ax.set_ylim(0, 105)
-            plt.xticks(rotation=0);
-            plt.tight_layout()
-            for i, p in enumerate(ax.patches):
-                height = p.get_height()
-                count = rank_analysis['count'].iloc[i]
-                label_text = f"{height:.1f}% | {count}"
-                ax.annotate(label_text, (p.get_x() + p.get_width() / 2., height), ha='center', va='center',
-                            xytext=(0, 5), textcoords='offset points', fontsize=11)
-            chart6_path = os.path.join(OUTPUT_PLOT_DIRECTORY, f"06_段位经济优势胜率_{time.strftime('%Y%m%d_%H%M')}.png")
-            plt.savefig(chart6_path);
-            plt.close()
-            print(f"[SUCCESS] 图表6 (段位胜率分析) 已保存至: {chart6_path}")
+    rank_lead_counts = accumulator.rank_lead_counts
+    if mode == '1' and accumulator.has_medal and rank_lead_counts:
+        categories = [rank for rank in RANK_GROUP_ORDER if rank in rank_lead_counts]
+        if categories:
+            games = np.array([rank_lead_counts[rank][0] for rank in categories])
+            wins = np.array([rank_lead_counts[rank][1] for rank in categories])
+            ci_low, ci_high = confidence_interval(wins, games)
+            level = f"{CONFIDENCE_LEVEL * 100:g}%"
+            specs.append({"kind": "rank_bar", "name": "图表6 (段位胜率分析)", "file_stem": "06_段位经济优势胜率",
+                          "categories": categories, "win_rates": (wins / games).tolist(), "counts": games.tolist(),
+                          "ci_low": ci_low.tolist(), "ci_high": ci_high.tolist(),
+                          "title": f'各段位下 率先达到 {threshold}G 经济领先后胜率 (误差线: {level} 置信区间)'})
+
+    # --- 图7: 经济领先阈值曲线 ---
+    if not sweep_df.empty:
+        def to_list(column):
+            return [None if value != value else float(value) for value in sweep_df[column]]
+        specs.append({"kind": "threshold_curve", "name": "图表7 (经济阈值曲线)", "file_stem": "07_经济阈值曲线",
+                      "thresholds": [int(value) for value in sweep_df['经济领先阈值']], "threshold": threshold,
+                      "lead_win_rates": to_list('领先后胜率(%)'), "comeback_rates": to_list('翻盘成功率(%)'),
+                      "median_minutes": to_list('首次达到阈值的中位分钟'),
+                      "title": f'不同经济领先阈值下的胜率曲线 (总样本: {int(sweep_df["有效样本数"].iloc[0])} 场)'})
+    return specs
 
 
 # ==============================================================================
-# 主程序入口
+# 最终步骤：生成报告和图表
 # ==============================================================================
-if __name__ == "__main__":
-    config = get_user_input()
-    results_df, advantage_col_name = (None, None)
+def get_output_tag(config):
+    return f"{'sample' if config['mode'] == '1' else 'personal'}_{config['account_id']}_{time.strftime('%Y%m%d_%H%M')}"
+
+
+def get_raw_columns(advantage_col_name, config):
+    # 固定列顺序，分块写出时每一块的列都能对齐
+    columns = ["Player_ID", "Analyzed_Match_ID", "Analysis_Status", "Medal", "Hero", "Role", "Is_Radiant", "Won_Match",
+               advantage_col_name]
+    if config['mode'] == '2':
+        columns = [PERSONAL_MODE_COLUMNS.get(column, column) for column in columns]
+    return columns
+
+
+def save_rows_csv(checkpoint, config):
+    # 仅数据模式：不依赖 pandas，直接把检查点中的逐行结果写成 CSV
+    print("\n--- 分析完成，正在保存分析数据 (仅数据模式) ---")
+    if checkpoint is None or not checkpoint.row_count:
+        print("没有收集到有效数据。")
+        return None
+    rename = PERSONAL_MODE_COLUMNS if config['mode'] == '2' else {}
+    fieldnames = get_raw_columns(f"First_Team_to_{config['threshold']}_Adv", config)
+    output_csv_file = f"dota_analysis_data_{get_output_tag(config)}.csv"
+    with open(output_csv_file, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        for row in checkpoint.iter_rows():
+            writer.writerow({rename.get(key, key): value for key, value in row.items()})
+    print(f"[SUCCESS] 分析数据已保存至: {os.path.abspath(output_csv_file)}")
+    return output_csv_file
+
+
+class ReportAccumulator:
+    # 分块累加报告所需的全部统计量，无需把全部结果同时放在内存中
+    def __init__(self, advantage_col_name, config):
+        self.advantage_col_name = advantage_col_name
+        self.match_id_col = PERSONAL_MODE_COLUMNS["Analyzed_Match_ID"] if config['mode'] == '2' else "Analyzed_Match_ID"
+        self.total_rows = 0
+        self.has_advantage_col = False
+        self.has_medal = False
+        self.cube = AggregationCube()
+        self.sweep_parts = []
+        self.sweep_counts = None  # 已并入阈值曲线的累计计数
+        self.sweep_samples = 0
+
+    @classmethod
+    def from_state(cls, state, advantage_col_name, config):
+        # 从上次报告保存的累计计数继续；参数不一致时从头统计
+        accumulator = cls(advantage_col_name, config)
+        if (not state or 'cube' not in state or state.get('advantage_col_name') != advantage_col_name
+                or state.get('sweep_thresholds') != get_sweep_thresholds(config).tolist()):
+            return accumulator
+        accumulator.total_rows = state['total_rows']
+        accumulator.has_advantage_col = state['has_advantage_col']
+        accumulator.has_medal = state['has_medal']
+        accumulator.cube = AggregationCube.from_state(state['cube'])
+        if state.get('sweep_counts'):
+            accumulator.sweep_counts = {key: np.asarray(value, dtype=np.int64)
+                                        for key, value in state['sweep_counts'].items()}
+            accumulator.sweep_samples = state['sweep_samples']
+        return accumulator
+
+    def to_state(self, config):
+        return {"advantage_col_name": self.advantage_col_name,
+                "sweep_thresholds": get_sweep_thresholds(config).tolist(), "total_rows": self.total_rows,
+                "has_advantage_col": self.has_advantage_col, "has_medal": self.has_medal,
+                "cube": self.cube.to_state(),
+                "sweep_counts": {key: value.tolist() for key, value in self.sweep_counts.items()}
+                if self.sweep_counts is not None else None,
+                "sweep_samples": self.sweep_samples}
+
+    def add(self, chunk_df):
+        import pandas as pd
+        self.total_rows += len(chunk_df)
+        if self.advantage_col_name not in chunk_df.columns or chunk_df[self.advantage_col_name].isna().all():
+            return
+        self.has_advantage_col = True
+        valid = chunk_df[chunk_df[self.advantage_col_name].isin([0, 1])]
+        if valid.empty:
+            return
+        advantage = pd.to_numeric(valid[self.advantage_col_name]).to_numpy(dtype=np.int64)
+        won = pd.to_numeric(valid['Won_Match']).to_numpy(dtype=np.int64)
+        if valid['Medal'].notna().any():
+            self.has_medal = True
+        rank_groups = valid['Medal'].astype(object).fillna("未定级").astype(str).str.split(' ').str[0]
+        self.cube.add(rank_groups.to_numpy(), valid['Hero'].astype(object).fillna("未知").to_numpy(),
+                      valid['Role'].astype(object).fillna("未知").to_numpy(), advantage, won)
+        self.sweep_parts.append((valid[self.match_id_col].to_numpy(dtype=np.int64),
+                                 pd.to_numeric(valid['Is_Radiant']).to_numpy(dtype=np.int8), won.astype(np.int8)))
+
+    @property
+    def outcomes(self):
+        # outcomes[是否率先领先][是否获胜]
+        games, wins = self.cube.marginal("lead")
+        return np.stack([games - wins, wins], axis=1)
+
+    @property
+    def rank_lead_counts(self):
+        # 段位 -> [率先领先局数, 其中获胜局数]
+        labels, games, wins = self.cube.breakdown("rank_group")
+        return {label: [int(games[i, 1]), int(wins[i, 1])] for i, label in enumerate(labels) if games[i, 1]}
+
+    @property
+    def valid_count(self):
+        return int(self.cube.games.sum())
+
+    def sweep_arrays(self):
+        if not self.sweep_parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int8), np.zeros(0, dtype=np.int8)
+        return tuple(np.concatenate(part) for part in zip(*self.sweep_parts))
+
+
+def build_summary_stats(accumulator, config):
+    mode, threshold = config['mode'], config['threshold']
+    outcomes = accumulator.outcomes
+    summary_stats = {"分析模式": "抽样调查" if mode == '1' else "个人战绩", "经济领先阈值": threshold}
+    if accumulator.valid_count:
+        lead_games, comeback_games = int(outcomes[1].sum()), int(outcomes[0].sum())
+        summary_stats["总有效分析样本数"] = accumulator.valid_count
+        summary_stats[f"率先达到{threshold}G领先的样本数"] = lead_games
+        level = f"{CONFIDENCE_LEVEL * 100:g}%"
+        if lead_games:
+            summary_stats[f"率先达到{threshold}G领先后胜率"] = f"{outcomes[1][1] / lead_games * 100:.2f}%"
+            summary_stats[f"领先后胜率{level}置信区间 ({CI_METHOD})"] = format_rate_interval(outcomes[1][1],
+                                                                                     lead_games)
+        else:
+            summary_stats[f"率先达到{threshold}G领先后胜率"] = "0% (无此类样本)"
+        if comeback_games:
+            summary_stats["翻盘成功率 (未率先达到领先)"] = f"{outcomes[0][1] / comeback_games * 100:.2f}%"
+            summary_stats[f"翻盘成功率{level}置信区间 ({CI_METHOD})"] = format_rate_interval(outcomes[0][1],
+                                                                                     comeback_games)
+        else:
+            summary_stats["翻盘成功率 (未率先达到领先)"] = "N/A (无劣势对局样本)"
+    else:
+        summary_stats["说明"] = "未能找到足够的数据进行统计"
+    return summary_stats
+
+
+def compute_threshold_sweep(accumulator, dataset, config):
+    import pandas as pd
+    thresholds = get_sweep_thresholds(config)
+    match_ids, is_radiant, won_match = accumulator.sweep_arrays()
+    if len(match_ids) and dataset is not None and len(dataset):
+        match_indexes = dataset.index_of(match_ids)
+        found = match_indexes >= 0
+        if found.any():
+            # 只对新增的样本扫描经济曲线，再与上次保存的累计计数相加
+            counts = count_threshold_sweep(dataset, match_indexes[found], is_radiant[found], won_match[found],
+                                           thresholds)
+            accumulator.sweep_counts = merge_threshold_counts(accumulator.sweep_counts, counts)
+            accumulator.sweep_samples += int(found.sum())
+    accumulator.sweep_parts = []
+    if not accumulator.valid_count or not accumulator.sweep_samples:
+        return pd.DataFrame()
+    return summarize_threshold_counts(thresholds, accumulator.sweep_counts, accumulator.sweep_samples)
+
+
+def encode_categorical_columns(df):
+    # 段位/英雄/位置/状态只有少量取值，category 类型在内存中只保存整数编码，写入 Parquet 时为字典编码
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    return df
+
+
+def get_raw_spill_format():
+    if RAW_SPILL_FORMAT == "csv":
+        return "csv"
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        if RAW_SPILL_FORMAT == "parquet":
+            print("[WARNING] 未安装 pyarrow，原始数据改为分块 CSV 输出")
+        return "csv"
+    return "parquet"
+
+
+class RawDataSpill:
+    # 原始数据过大时的外部文件输出：Parquet 单文件，或每 RAW_SPILL_CSV_ROWS 行一个 CSV 分块
+    def __init__(self, raw_columns, config):
+        self.raw_columns = raw_columns
+        self.file_format = get_raw_spill_format()
+        self.file_stem = f"dota_analysis_data_{get_output_tag(config)}"
+        self.paths = []
+        self.parquet_writer = None
+        self.csv_file = None
+        self.csv_rows = 0
+
+    def get_parquet_schema(self):
+        import pyarrow as pa
+        fields = []
+        for column in self.raw_columns:
+            if column in CATEGORICAL_COLUMNS:
+                fields.append(pa.field(column, pa.dictionary(pa.int32(), pa.string())))
+            elif column.endswith("_ID"):
+                fields.append(pa.field(column, pa.int64()))
+            else:
+                fields.append(pa.field(column, pa.float64()))
+        return pa.schema(fields)
+
+    def write(self, chunk_df):
+        import pandas as pd
+        if self.file_format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self.parquet_writer is None:
+                self.paths.append(f"{self.file_stem}.parquet")
+                self.parquet_writer = pq.ParquetWriter(self.paths[-1], self.get_parquet_schema())
+            chunk_df = chunk_df.copy()
+            for column in self.raw_columns:
+                if column not in CATEGORICAL_COLUMNS:
+                    chunk_df[column] = pd.to_numeric(chunk_df[column], errors='coerce')
+            self.parquet_writer.write_table(
+                pa.Table.from_pandas(chunk_df, schema=self.parquet_writer.schema, preserve_index=False))
+            return
+        start = 0
+        while start < len(chunk_df):
+            if self.csv_file is None or self.csv_rows >= RAW_SPILL_CSV_ROWS:
+                self.close()
+                self.paths.append(f"{self.file_stem}_part{len(self.paths) + 1:03d}.csv")
+                self.csv_file = open(self.paths[-1], 'w', newline='', encoding='utf-8-sig')
+                self.csv_rows = 0
+            part = chunk_df.iloc[start:start + RAW_SPILL_CSV_ROWS - self.csv_rows]
+            part.to_csv(self.csv_file, index=False, header=self.csv_rows == 0)
+            self.csv_rows += len(part)
+            start += len(part)
+
+    def close(self):
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
+
+
+class ReportWriter:
+    # 流式写出 Excel 报告：write-only 工作簿逐行写入磁盘，内存占用与行数无关；
+    # 原始数据行数超过 EXCEL_MAX_RAW_ROWS 时交给 RawDataSpill，Excel 中只保留文件位置说明和各统计表
+    def __init__(self, output_path, raw_columns, total_rows, config):
+        from openpyxl import Workbook
+        self.output_path = output_path
+        self.workbook = Workbook(write_only=True)
+        self.raw_sheet = self.workbook.create_sheet(RAW_DATA_SHEET_NAME)
+        self.spill = RawDataSpill(raw_columns, config) if total_rows > EXCEL_MAX_RAW_ROWS else None
+        if self.spill is None:
+            self.append_header(self.raw_sheet, raw_columns)
+        else:
+            print(f"[INFO] 原始数据共 {total_rows} 行，超过 Excel 写入上限 ({EXCEL_MAX_RAW_ROWS} 行)，"
+                  f"将另存为 {self.spill.file_format.upper()} 文件")
+
+    @staticmethod
+    def append_header(sheet, columns):
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+        cells = []
+        for column in columns:
+            cell = WriteOnlyCell(sheet, value=column)
+            cell.font = Font(bold=True)
+            cells.append(cell)
+        sheet.append(cells)
+
+    @staticmethod
+    def append_rows(sheet, df):
+        # 缺失值写为空单元格 (openpyxl 会把 NaN 原样写成无效数值)
+        values = df.astype(object).where(df.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            sheet.append(row)
+
+    def write_raw(self, chunk_df):
+        if self.spill is not None:
+            self.spill.write(chunk_df)
+        else:
+            self.append_rows(self.raw_sheet, chunk_df)
+
+    def write_table(self, sheet_name, df):
+        sheet = self.workbook.create_sheet(sheet_name)
+        self.append_header(sheet, [str(column) for column in df.columns])
+        self.append_rows(sheet, df)
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
+            self.append_header(self.raw_sheet, ["原始数据文件"])
+            for path in self.spill.paths:
+                self.raw_sheet.append([os.path.abspath(path)])
+            for path in self.spill.paths:
+                print(f"[SUCCESS] 原始数据已保存至: {os.path.abspath(path)}")
+        self.workbook.save(self.output_path)
+
+
+def generate_report_and_plots(checkpoint, advantage_col_name, config, dataset=None):
+    import pandas as pd
+    print("\n--- 分析完成，正在生成最终报告和图表 ---")
+    if checkpoint is None or not checkpoint.row_count:
+        print("没有收集到有效数据，无法生成报告。")
+        return
+    raw_columns = get_raw_columns(advantage_col_name, config)
+    accumulator = ReportAccumulator.from_state(checkpoint.manifest.get('report_state'), advantage_col_name, config)
+    accumulated_rows = accumulator.total_rows
+    if accumulated_rows:
+        print(f"[INFO] 沿用上次的累计统计 ({accumulated_rows} 行)，只累加新增的 {checkpoint.row_count - accumulated_rows} 行")
+    output_excel_file = f"dota_analysis_report_{get_output_tag(config)}.xlsx"
+    writer = ReportWriter(output_excel_file, raw_columns, checkpoint.row_count, config) \
+        if config.get('report', True) else None
+
+    # 逐块读取检查点：一边写出原始数据，一边累加统计量
+    metrics = get_metrics()
+    row_index = 0
+    with metrics.timer("dota_stage_seconds", stage="report_rows"):
+        for chunk in checkpoint.iter_chunks():
+            # 已计入累计统计的行只写入原始数据表，不再重复累加
+            skip_rows = min(len(chunk), max(0, accumulated_rows - row_index))
+            row_index += len(chunk)
+            if writer is None and skip_rows == len(chunk):
+                continue
+            chunk_df = pd.DataFrame(chunk)
+            if config['mode'] == '2':
+                # 个人模式下，重命名列以保持一致性
+                chunk_df = chunk_df.rename(columns=PERSONAL_MODE_COLUMNS)
+            chunk_df = encode_categorical_columns(chunk_df.reindex(columns=raw_columns))
+            if skip_rows < len(chunk_df):
+                accumulator.add(chunk_df.iloc[skip_rows:])
+            if writer is not None:
+                writer.write_raw(chunk_df)
+
+    if not accumulator.has_advantage_col:
+        print(f"\n[ERROR] 关键数据列 '{advantage_col_name}' 不存在。")
+        print("这通常意味着在所有分析的比赛中，都未能获取到有效的经济数据。")
+        if writer is not None:
+            writer.close()
+            partial_excel_file = f"dota_analysis_report_(partial)_{get_output_tag(config)}.xlsx"
+            os.replace(output_excel_file, partial_excel_file)
+            print(f"\n已保存部分分析报告至: {os.path.abspath(partial_excel_file)}")
+        return
+
+    # --- 核心统计计算 ---
+    with metrics.timer("dota_stage_seconds", stage="report_stats"):
+        summary_df = pd.DataFrame(list(build_summary_stats(accumulator, config).items()), columns=['统计项', '结果'])
+        breakdown_sheets = [(sheet_name, build_breakdown_table(accumulator.cube, dim, label_title))
+                            for sheet_name, dim, label_title in BREAKDOWN_SHEETS]
+        sweep_df = compute_threshold_sweep(accumulator, dataset if dataset is not None else MatchDataset.open(),
+                                           config)
+    checkpoint.manifest['report_state'] = accumulator.to_state(config)
+    checkpoint.save_manifest()
+    if writer is not None:
+        with metrics.timer("dota_stage_seconds", stage="report_excel"):
+            writer.write_table('统计概要 (Summary)', summary_df)
+            if not sweep_df.empty:
+                writer.write_table('阈值曲线 (Threshold Sweep)', sweep_df)
+            for sheet_name, table in breakdown_sheets:
+                if not table.empty:
+                    writer.write_table(sheet_name, table)
+            writer.close()
+        print(f"\n[SUCCESS] 最终报告已保存至: {os.path.abspath(output_excel_file)}")
+
+    # --- 绘图 ---
+    if not config.get('plots', True):
+        print("[INFO] 已关闭图表输出，跳过绘图步骤。")
+        return
+    if not accumulator.valid_count:
+        print("[INFO] 无有效数据，跳过绘图步骤。")
+        return
+    plot_directory = config.get('plot_directory') or OUTPUT_PLOT_DIRECTORY
+    if not os.path.exists(plot_directory): os.makedirs(plot_directory)
+    timestamp = time.strftime('%Y%m%d_%H%M')
+    image_format = config.get('plot_format') or PLOT_FORMAT
+    with metrics.timer("dota_stage_seconds", stage="plot_prepare"):
+        specs = prepare_chart_specs(accumulator, sweep_df, config)
+    for spec in specs:
+        spec['path'] = os.path.join(plot_directory, f"{spec.pop('file_stem')}_{timestamp}.{image_format}")
+    print(f"正在生成 {len(specs)} 张图表 ({image_format.upper()})...")
+    submit_charts(specs)
+
+
+# ==============================================================================
+# 单个分析任务
+# ==============================================================================
+def collect_sample_player_ids(config):
+    print(f"步骤1/3：正在扫描您的最近 {config['scan_count']} 场比赛以收集玩家...")
+    my_matches = get_api_data(f"{BASE_URL}/players/{config['account_id']}/matches?limit={config['scan_count']}")
+    if not my_matches:
+        return None
+    all_player_ids = set()
+    print(f"  并发扫描您的 {len(my_matches)} 场比赛...")
+    my_match_details = fetch_concurrently(
+        lambda match_summary: get_api_data(f"{BASE_URL}/matches/{match_summary['match_id']}"), my_matches)
+    for match_details in my_match_details:
+        if match_details and 'players' in match_details:
+            for player in match_details['players']:
+                if player.get('account_id') and player['account_id'] != config['account_id']:
+                    all_player_ids.add(player['account_id'])
+    return all_player_ids
+
+
+def crawl_sample_jobs(config):
+    # 广度优先的滚雪球抽样：每名玩家取一场未见过的最近比赛作为样本，这场比赛中符合段位条件的其他玩家进入待访问队列
+    target = config['sample_target']
+    brackets = set(config.get('rank_brackets') or [])
+    bracket_text = "、".join(RANK_BRACKETS[b] for b in sorted(brackets)) if brackets else "不限"
+    print(f"步骤1/3：从您最近的 {config['scan_count']} 场比赛出发扩展玩家样本 (目标 {target} 个样本，段位: {bracket_text})...")
+    seen_players, seen_matches = {config['account_id']}, set()
+    frontier = deque()
+    analysis_jobs = []
+
+    def expand(match_ids):
+        for match_details in fetch_concurrently(lambda match_id: get_api_data(f"{BASE_URL}/matches/{match_id}"),
+                                                match_ids):
+            for player in (match_details or {}).get('players') or []:
+                account_id, rank_tier = player.get('account_id'), player.get('rank_tier')
+                if not account_id or account_id in seen_players or len(frontier) >= CRAWL_MAX_FRONTIER:
+                    continue
+                if brackets and not (rank_tier and rank_tier // 10 in brackets):
+                    continue
+                seen_players.add(account_id)
+                frontier.append(account_id)
+
+    seed_matches = get_api_data(f"{BASE_URL}/players/{config['account_id']}/matches?limit={config['scan_count']}") or []
+    seen_matches.update(match['match_id'] for match in seed_matches)
+    expand([match['match_id'] for match in seed_matches])
+    while frontier and len(analysis_jobs) < target:
+        batch = [frontier.popleft() for _ in range(min(len(frontier), CRAWL_BATCH_PLAYERS))]
+        player_matches = fetch_concurrently(
+            lambda player_id: get_api_data(
+                f"{BASE_URL}/players/{player_id}/matches?limit={CRAWL_PLAYER_MATCH_LOOKBACK}"), batch)
+        new_match_ids = []
+        for player_id, matches in zip(batch, player_matches):
+            match = next((m for m in matches or [] if m['match_id'] not in seen_matches), None)
+            if match is None:
+                continue
+            seen_matches.add(match['match_id'])
+            new_match_ids.append(match['match_id'])
+            analysis_jobs.append({'match_id': match['match_id'], 'player_id': player_id,
+                                  'start_time': match.get('start_time')})
+            if len(analysis_jobs) >= target:
+                break
+        print(f"  已采样 {len(analysis_jobs)}/{target}，待访问玩家 {len(frontier)} 名，已见过 {len(seen_players)} 名玩家、"
+              f"{len(seen_matches)} 场比赛")
+        if len(analysis_jobs) < target:
+            # 达到目标后不再扩展；这些比赛详情在分析阶段会直接命中缓存
+            expand(new_match_ids)
+    if len(analysis_jobs) < target:
+        print(f"[WARNING] 可访问的玩家已耗尽，只采集到 {len(analysis_jobs)} 个样本。")
+    return analysis_jobs
+
+
+def discover_sample_jobs(config):
+    if config.get('sample_target'):
+        return crawl_sample_jobs(config)
+    all_player_ids = collect_sample_player_ids(config)
+    # 模式1获取每个样本的最新1场比赛
+    return build_analysis_jobs(all_player_ids, scan_limit=1) if all_player_ids else []
+
+
+def run_job(config):
+    refresh = bool(config.get('refresh')) and config['mode'] == '2'
+    if config.get('refresh') and not refresh:
+        print("\n[INFO] 增量刷新只适用于个人战绩模式，本次按常规方式运行。")
+    checkpoint = RunCheckpoint.find_resumable(config) if config.get('resume') and not refresh else None
+    if refresh:
+        print("\n--- 已选择：个人战绩模式 (增量刷新) ---")
+        checkpoint = open_refresh_checkpoint(config)
+        report_state = checkpoint.manifest.get('report_state') or {}
+        if not checkpoint.pending_jobs() and report_state.get('total_rows') == checkpoint.row_count:
+            checkpoint.close(completed=True)
+            print("[INFO] 没有新的比赛，统计结果无需更新。")
+            return
+    elif checkpoint is not None:
+        print(f"\n[INFO] 继续未完成的运行: {checkpoint.directory} (已完成 {checkpoint.row_count} 行)")
+    else:
+        checkpoint = RunCheckpoint.create(config)
+    advantage_col_name, dataset = f"First_Team_to_{config['threshold']}_Adv", None
 
     if config['mode'] == '1':
         print("\n--- 已选择：抽样调查模式 ---")
-        print(f"步骤1/3：正在扫描您的最近 {config['scan_count']} 场比赛以收集玩家...")
-        my_matches = get_api_data(f"{BASE_URL}/players/{config['account_id']}/matches?limit={config['scan_count']}")
-        if my_matches:
-            all_player_ids = set()
-            for i, match_summary in enumerate(my_matches):
-                print(f"  扫描您的比赛 {i + 1}/{len(my_matches)}...")
-                match_details = get_api_data(f"{BASE_URL}/matches/{match_summary['match_id']}")
-                if match_details and 'players' in match_details:
-                    for player in match_details['players']:
-                        if player.get('account_id') and player['account_id'] != config['account_id']:
-                            all_player_ids.add(player['account_id'])
-
-            # 模式1获取每个样本的最新1场比赛
-            results_df, advantage_col_name = run_analysis_flow(config, all_player_ids, scan_limit=1)
+        # 恢复运行时任务列表已记录在检查点中，无需重新收集玩家样本
+        if checkpoint.jobs is None:
+            checkpoint.set_jobs(discover_sample_jobs(config))
+        if checkpoint.jobs:
+            checkpoint, advantage_col_name, dataset = run_analysis_flow(config, set(), scan_limit=1,
+                                                                        checkpoint=checkpoint)
 
     elif config['mode'] == '2':
-        print("\n--- 已选择：个人战绩模式 ---")
+        if not refresh:
+            print("\n--- 已选择：个人战绩模式 ---")
         # 模式2的样本只有自己，获取scan_count场比赛
         player_ids_to_scan = {config['account_id']}
-        results_df, advantage_col_name = run_analysis_flow(config, player_ids_to_scan, scan_limit=config['scan_count'])
-        # 个人模式下，重命名列以保持一致性
-        if results_df is not None:
-            results_df = results_df.rename(columns={"Player_ID": "My_Account_ID", "Analyzed_Match_ID": "Match_ID"})
+        checkpoint, advantage_col_name, dataset = run_analysis_flow(config, player_ids_to_scan,
+                                                                    scan_limit=config['scan_count'],
+                                                                    checkpoint=checkpoint)
+
+    if config.get('report', True) or config.get('plots', True):
+        generate_report_and_plots(checkpoint, advantage_col_name, config, dataset)
+    else:
+        save_rows_csv(checkpoint, config)
+
+
+# ==============================================================================
+# 命令行 / 配置文件批处理模式
+# ==============================================================================
+def validate_job_config(job):
+    job = dict(job)
+    job['mode'] = str(job.get('mode', '2'))
+    if job['mode'] not in ('1', '2'):
+        raise ValueError(f"分析模式必须是 1 或 2: {job['mode']}")
+    for key in ('account_id', 'scan_count', 'threshold'):
+        if key not in job:
+            raise ValueError(f"任务缺少必填项 '{key}': {job}")
+        job[key] = int(job[key])
+        if job[key] <= 0:
+            raise ValueError(f"'{key}' 必须是大于0的数字: {job}")
+    if job.get('sweep_thresholds'):
+        job['sweep_thresholds'] = [int(value) for value in job['sweep_thresholds']]
+    if job.get('sample_target'):
+        job['sample_target'] = int(job['sample_target'])
+    if job.get('rank_brackets'):
+        job['rank_brackets'] = [int(value) for value in job['rank_brackets']]
+        if not set(job['rank_brackets']) <= set(RANK_BRACKETS):
+            raise ValueError(f"段位编号必须在 1-8 之间: {job['rank_brackets']}")
+    return job
+
 
-    generate_report_and_plots(results_df, advantage_col_name, config)
-    print("\n--- 执行完毕 ---")
\ No newline at end of file
+def load_batch_jobs(args):
+    # 配置文件的顶层字段作为所有任务的默认值，jobs 中的字段覆盖默认值
+    defaults, jobs, fetch_options = {}, [], {}
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            file_config = json.load(f)
+        fetch_options = file_config.pop('fetch', {})
+        jobs = file_config.pop('jobs', [])
+        defaults.update(file_config)
+    for key in ('mode', 'scan_count', 'threshold', 'sweep_thresholds', 'sample_target', 'rank_brackets'):
+        if getattr(args, key) is not None:
+            defaults[key] = getattr(args, key)
+    if args.no_report or args.data_only:
+        defaults['report'] = False
+    if args.no_plots or args.data_only:
+        defaults['plots'] = False
+    if args.svg:
+        defaults['plot_format'] = 'svg'
+    if args.resume:
+        defaults['resume'] = True
+    if args.refresh:
+        defaults['refresh'] = True
+    jobs = jobs + [{'account_id': account_id} for account_id in args.account_id or []]
+    if not jobs and 'account_id' in defaults:
+        jobs = [{}]
+    return [validate_job_config({**defaults, **job}) for job in jobs], fetch_options
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Dota 2 经济优势与胜率分析工具。不带参数运行时进入交互模式。")
+    parser.add_argument('--config', help="批处理配置文件 (JSON)，包含 jobs 列表及默认参数")
+    parser.add_argument('--account-id', type=int, nargs='+', help="要分析的 Account ID，可一次指定多个")
+    parser.add_argument('--mode', choices=['1', '2'], help="1 抽样调查模式 / 2 个人战绩模式")
+    parser.add_argument('--scan-count', type=int, help="扫描的比赛数量")
+    parser.add_argument('--threshold', type=int, help="经济优势阈值")
+    parser.add_argument('--sweep-thresholds', type=int, nargs='+', help="阈值曲线中要扫描的阈值列表")
+    parser.add_argument('--sample-target', type=int,
+                        help="模式1的目标样本数：沿玩家-比赛关系广度优先扩展，达到该数量即停止")
+    parser.add_argument('--rank-brackets', type=int, nargs='+', choices=sorted(RANK_BRACKETS),
+                        help="模式1只采样这些段位的玩家 (1 先锋 ... 8 冠绝)")
+    parser.add_argument('--no-report', action='store_true', help="不生成 Excel 报告")
+    parser.add_argument('--no-plots', action='store_true', help="不生成图表")
+    parser.add_argument('--data-only', action='store_true', help="仅导出分析数据 (CSV)，等同于 --no-report --no-plots")
+    parser.add_argument('--svg', action='store_true', help="图表输出为 SVG 矢量图 (默认 PNG)")
+    parser.add_argument('--plot-workers', type=int, help="图表渲染进程数，1 表示在主进程中逐个渲染")
+    parser.add_argument('--ci-method', choices=['wilson', 'bootstrap'], help="胜率置信区间的计算方法 (默认 wilson)")
+    parser.add_argument('--fetch-mode', choices=['concurrent', 'sequential'], help="抓取模式")
+    parser.add_argument('--max-workers', type=int, help="最大并发请求数")
+    parser.add_argument('--rate-per-second', type=float, help="每秒请求额度")
+    parser.add_argument('--rate-per-minute', type=float, help="每分钟请求额度")
+    parser.add_argument('--no-cache', action='store_true', help="禁用本地缓存")
+    parser.add_argument('--metrics-json', help="运行结束后把运行指标摘要写入 JSON 文件")
+    parser.add_argument('--metrics-prom', help="运行结束后把运行指标以 Prometheus 文本格式写入文件")
+    parser.add_argument('--profile', help="使用 cProfile 分析主线程并把结果写入文件 (可用 snakeviz 等工具查看)")
+    parser.add_argument('--api-key', help="OpenDota API Key (也可通过环境变量 OPENDOTA_API_KEY 设置)")
+    parser.add_argument('--queue', help="共享任务队列 (SQLite 文件)，多个 worker 进程/机器可同时从中领取任务")
+    parser.add_argument('--queue-action', choices=['init', 'work', 'report', 'status'], default='work',
+                        help="init 收集任务并写入队列 / work 作为 worker 领取任务 / report 汇总生成报告 / status 查看进度")
+    parser.add_argument('--worker-id', help="worker 名称，默认为 <主机名>-<进程号>")
+    parser.add_argument('--base-url', help="OpenDota API 地址，可指向本地替身服务器 (见 dota_benchmark.py serve)")
+    parser.add_argument('--resume', action='store_true', help="继续相同参数下最近一次未完成的运行，跳过已完成的比赛")
+    parser.add_argument('--refresh', action='store_true',
+                        help="增量刷新 (仅模式2)：只获取上次记录的最新比赛之后的新比赛，并在上次的统计结果上累加")
+    return parser
+
+
+def run_with_profile(profile_path, func):
+    # 可选的 cProfile 钩子：只统计主线程，抓取线程池中的耗时体现为主线程的等待
+    if not profile_path:
+        return func()
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func)
+    finally:
+        profiler.dump_stats(profile_path)
+        print(f"\n[INFO] cProfile 结果已保存至: {os.path.abspath(profile_path)}，累计耗时最多的函数：")
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+
+
+def run_batch_jobs(jobs):
+    print(f"--- 批处理模式：共 {len(jobs)} 个分析任务 ---")
+    for i, job in enumerate(jobs):
+        print(f"\n===== 任务 {i + 1}/{len(jobs)}：Account {job['account_id']} / 模式 {job['mode']} =====")
+        # 每个任务的图表放在独立子目录，避免互相覆盖
+        job.setdefault('plot_directory', os.path.join(OUTPUT_PLOT_DIRECTORY, f"{job['account_id']}_mode{job['mode']}"))
+        try:
+            run_job(job)
+        except KeyboardInterrupt:
+            print("\n[INFO] 已中断，已完成的结果已保存，可使用 --resume 继续。")
+            return 130
+    wait_for_charts()
+    return 0
+
+
+def configure_from_args(args, fetch_options=None):
+    global PLOT_WORKERS, CI_METHOD
+    fetch_options = fetch_options or {}
+    configure_fetch_engine(mode=args.fetch_mode or fetch_options.get('mode'),
+                           max_workers=args.max_workers or fetch_options.get('max_workers'),
+                           per_second=args.rate_per_second or fetch_options.get('per_second'),
+                           per_minute=args.rate_per_minute or fetch_options.get('per_minute'),
+                           api_key=args.api_key or fetch_options.get('api_key'))
+    if args.no_cache:
+        configure_cache(enabled=False)
+    if args.plot_workers is not None:
+        PLOT_WORKERS = max(1, args.plot_workers)
+    if args.ci_method:
+        CI_METHOD = args.ci_method
+
+
+def run_queue_command(args):
+    configure_from_args(args)
+    if args.queue_action == 'status':
+        queue = WorkQueue(args.queue)
+        print(f"队列状态: {queue.counts()}，结果 {queue.row_count} 行")
+        for worker, count in queue.worker_counts():
+            print(f"  Worker {worker}: {count} 行")
+        queue.close()
+        return 0
+    if args.queue_action == 'init':
+        try:
+            jobs, _ = load_batch_jobs(args)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[ERROR] 任务配置无效: {e}")
+            return 2
+        if len(jobs) != 1:
+            print("[ERROR] 一个共享队列只对应一个分析任务，请只指定一个 Account ID。")
+            return 2
+        run_with_profile(args.profile, lambda: init_queue(args.queue, jobs[0]))
+        exit_code = 0
+    elif args.queue_action == 'work':
+        exit_code = run_with_profile(args.profile, lambda: run_queue_worker(args.queue, args.worker_id))
+    else:
+        # 报告的输出选项以汇总时的命令行为准
+        overrides = {}
+        if args.no_report or args.data_only:
+            overrides['report'] = False
+        if args.no_plots or args.data_only:
+            overrides['plots'] = False
+        if args.svg:
+            overrides['plot_format'] = 'svg'
+        exit_code = run_with_profile(args.profile, lambda: report_queue(args.queue, overrides))
+    print_cache_stats()
+    print_metrics_summary()
+    export_metrics(args.metrics_json, args.metrics_prom)
+    return exit_code
+
+
+def main(argv=None):
+    global BASE_URL
+    args = build_arg_parser().parse_args(argv)
+    if args.base_url:
+        BASE_URL = args.base_url.rstrip('/')
+    if args.queue:
+        return run_queue_command(args)
+    if not (args.config or args.account_id):
+        # 交互模式
+        config = get_user_input()
+        if RunCheckpoint.find_resumable(config) is not None:
+            config['resume'] = input("检测到相同参数下未完成的分析，是否继续上次的进度？(y/n)\n> ").strip().lower() == 'y'
+        try:
+            run_job(config)
+        except KeyboardInterrupt:
+            print("\n[INFO] 已中断，已完成的结果已保存，下次以相同参数运行时可选择继续。")
+            return 130
+        wait_for_charts()
+        print_cache_stats()
+        print_metrics_summary()
+        print("\n--- 执行完毕 ---")
+        return 0
+
+    try:
+        jobs, fetch_options = load_batch_jobs(args)
+    except (OSError, ValueError, TypeError) as e:
+        print(f"[ERROR] 批处理配置无效: {e}")
+        return 2
+    configure_from_args(args, fetch_options)
+    exit_code = run_with_profile(args.profile, lambda: run_batch_jobs(jobs))
+    print_cache_stats()
+    print_metrics_summary()
+    # 中断时也导出已采集的指标，便于分析慢在哪里
+    export_metrics(args.metrics_json, args.metrics_prom)
+    if exit_code == 0:
+        print("\n--- 批处理执行完毕 ---")
+    return exit_code
+
+
+# ==============================================================================
+# 主程序入口
+# ==============================================================================
+if __name__ == "__main__":
+    # 用 PyInstaller 打包为 EXE 后，图表渲染进程 (spawn) 会重新启动 EXE 本身；
+    # freeze_support 让这些子进程直接进入 worker，而不是再次运行交互式主程序
+    multiprocessing.freeze_support()
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,526 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+# ==============================================================================
+# 离线性能基准：本地 OpenDota 替身服务器 + 分阶段计时的基准测试
+# 用法：
+#   python dota_benchmark.py run --sizes 50 200 1000 --latency-ms 20 --output bench.json
+#   python dota_benchmark.py run --baseline bench.json       # 与基线比较，性能回退时返回非零退出码
+#   python dota_benchmark.py serve --port 8765               # 单独启动替身服务器，配合分析器的 --base-url 使用
+#   python dota_benchmark.py export-cache --out bench_data   # 把本地缓存中的真实比赛导出为可回放的数据
+# ==============================================================================
+BENCHMARK_ACCOUNT_ID = 100000001
+DEFAULT_SIZES = [50, 200, 1000]
+DEFAULT_THRESHOLD = 5000
+HERO_COUNT = 124
+RESULT_MARKER = "BENCHMARK_RESULT "
+
+# 基准运行时分析器的参数：放开限流、缩短解析等待，只测量管线本身
+BENCHMARK_MAX_WORKERS = 16
+BENCHMARK_RATE_PER_SECOND = 100000
+BENCHMARK_RATE_PER_MINUTE = 6000000
+BENCHMARK_PARSE_POLL_DELAY_SECONDS = 0.2
+BENCHMARK_PARSE_WAIT_DEADLINE_SECONDS = 10
+
+
+# ==============================================================================
+# OpenDota 替身服务器
+# ==============================================================================
+class StandInData:
+    # 优先回放录制的数据 (replay_dir 下的 heroes.json / matches/<id>.json / players/<id>.json)，否则按种子生成合成数据
+    def __init__(self, seed=0, replay_dir=None, payload_kb=0):
+        self.seed = seed
+        self.replay_dir = replay_dir
+        self.payload_kb = payload_kb
+        self.recorded_match_ids = []
+        if replay_dir and os.path.isdir(os.path.join(replay_dir, "matches")):
+            self.recorded_match_ids = sorted((int(name[:-5]) for name in os.listdir(os.path.join(replay_dir, "matches"))
+                                              if name.endswith(".json")), reverse=True)
+
+    def read_recorded(self, *parts):
+        if not self.replay_dir:
+            return None
+        path = os.path.join(self.replay_dir, *parts)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def heroes(self):
+        recorded = self.read_recorded("heroes.json")
+        if recorded is not None:
+            return recorded
+        return [{"id": hero_id, "localized_name": f"Hero {hero_id}"} for hero_id in range(1, HERO_COUNT + 1)]
+
+    def player_matches(self, account_id, limit, offset):
+        recorded = self.read_recorded("players", f"{account_id}.json")
+        if recorded is None and self.recorded_match_ids:
+            # 回放模式下没有录制玩家列表时，用全部录制的比赛作为该玩家的比赛列表
+            recorded = [{"match_id": match_id} for match_id in self.recorded_match_ids]
+        if recorded is not None:
+            return recorded[offset:offset + limit]
+        # 合成数据：match_id 从新到旧递减，与 OpenDota 的返回顺序一致
+        newest_match_id = 8000000000 + account_id % 1000000 * 10000
+        return [{"match_id": newest_match_id - index, "start_time": 1700000000 - index * 2400}
+                for index in range(offset, offset + limit)]
+
+    def match(self, match_id, account_id=None):
+        recorded = self.read_recorded("matches", f"{match_id}.json")
+        if recorded is not None:
+            players = recorded.get('players') or []
+            if account_id and players and all(player.get('account_id') != account_id for player in players):
+                # 录制的比赛属于别的账号：把第一名玩家替换成请求比赛列表的账号，使回放数据也能被完整分析
+                recorded['players'] = [dict(players[0], account_id=account_id)] + players[1:]
+            return recorded
+        rng = random.Random(self.seed * 1000003 + match_id)
+        duration_minutes = rng.randint(20, 60)
+        gold_adv = np.cumsum([rng.randint(-1500, 1500) for _ in range(duration_minutes)]).tolist()
+        players = []
+        for slot in range(10):
+            player = {"account_id": account_id if slot == 0 and account_id else rng.randint(1, 10 ** 9),
+                      "isRadiant": slot < 5, "player_slot": slot if slot < 5 else 123 + slot,
+                      "hero_id": rng.randint(1, HERO_COUNT), "rank_tier": rng.choice([11, 25, 35, 44, 54, 65, 75, 80]),
+                      "lane_role": rng.randint(1, 4),
+                      "gold_t": [minute * rng.randint(300, 700) for minute in range(duration_minutes)],
+                      "xp_t": [minute * rng.randint(300, 800) for minute in range(duration_minutes)]}
+            if self.payload_kb:
+                # 模拟真实比赛中体积庞大的逐玩家日志
+                player["purchase_log"] = [{"time": index, "key": "item_filler"} for index in
+                                          range(self.payload_kb * 1024 // 40 // 10)]
+            players.append(player)
+        return {"match_id": match_id, "radiant_win": rng.random() < 0.5, "duration": duration_minutes * 60,
+                "start_time": 1700000000, "radiant_gold_adv": gold_adv, "players": players}
+
+
+class StandInServer:
+    # 可注入延迟、429 限流和“尚未解析”应答的本地 HTTP 服务器
+    def __init__(self, data, latency_ms=0, jitter_ms=0, throttle_ratio=0.0, retry_after=1, unparsed_ratio=0.0,
+                 parse_delay=0.5, never_parsed_ratio=0.0, port=0):
+        self.data = data
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_ratio = throttle_ratio
+        self.retry_after = retry_after
+        self.unparsed_ratio = unparsed_ratio
+        self.parse_delay = parse_delay
+        self.never_parsed_ratio = never_parsed_ratio
+        self.parse_requested_at = {}
+        self.request_counts = {}
+        self.lock = threading.Lock()
+        self.rng = random.Random(data.seed)
+        self.match_owner = {}
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self.build_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count(self, key):
+        with self.lock:
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+
+    def parse_state(self, match_id):
+        # 每场比赛的解析状态由种子决定：大部分已解析，一部分在提交解析请求 parse_delay 秒后才解析，少数永不解析
+        rng = random.Random(self.data.seed * 7919 + match_id)
+        roll = rng.random()
+        if roll < self.never_parsed_ratio:
+            return "never"
+        if roll < self.never_parsed_ratio + self.unparsed_ratio:
+            return "delayed"
+        return "parsed"
+
+    def is_parsed(self, match_id):
+        state = self.parse_state(match_id)
+        if state == "parsed":
+            return True
+        if state == "never":
+            return False
+        with self.lock:
+            requested_at = self.parse_requested_at.get(match_id)
+        return requested_at is not None and time.monotonic() - requested_at >= self.parse_delay
+
+    def build_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 头部与正文分两次写出，关闭 Nagle 以免与延迟确认叠加出 40ms 的伪延迟
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, payload, status=200, headers=None):
+                body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def inject(self):
+                delay_ms = server.latency_ms + (server.rng.uniform(-1, 1) * server.jitter_ms if server.jitter_ms else 0)
+                if delay_ms > 0:
+                    time.sleep(delay_ms / 1000)
+                with server.lock:
+                    throttled = server.throttle_ratio and server.rng.random() < server.throttle_ratio
+                if throttled:
+                    server.count("429")
+                    self.send_json({"error": "rate limit exceeded"}, 429, {"Retry-After": str(server.retry_after)})
+                    return True
+                return False
+
+            def do_POST(self):
+                parts = urlsplit(self.path).path.strip('/').split('/')
+                server.count("POST /request")
+                if self.inject():
+                    return
+                if len(parts) >= 2 and parts[-2] == "request" and parts[-1].isdigit():
+                    with server.lock:
+                        server.parse_requested_at.setdefault(int(parts[-1]), time.monotonic())
+                    return self.send_json({"job": {"jobId": int(parts[-1])}})
+                self.send_json({"error": "not found"}, 404)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                parts = url.path.strip('/').split('/')
+                query = parse_qs(url.query)
+                if parts[-1] == "heroes":
+                    server.count("GET /heroes")
+                    if self.inject():
+                        return
+                    return self.send_json(server.data.heroes())
+                if len(parts) >= 3 and parts[-3] == "players" and parts[-1] == "matches":
+                    server.count("GET /players/{id}/matches")
+                    if self.inject():
+                        return
+                    account_id = int(parts[-2])
+                    matches = server.data.player_matches(account_id, int(query.get('limit', ['20'])[0]),
+                                                         int(query.get('offset', ['0'])[0]))
+                    with server.lock:
+                        for match in matches:
+                            server.match_owner.setdefault(match['match_id'], account_id)
+                    return self.send_json(matches)
+                if len(parts) >= 2 and parts[-2] == "matches" and parts[-1].isdigit():
+                    server.count("GET /matches/{id}")
+                    if self.inject():
+                        return
+                    match_id = int(parts[-1])
+                    with server.lock:
+                        account_id = server.match_owner.get(match_id)
+                    match = server.data.match(match_id, account_id)
+                    if not server.is_parsed(match_id):
+                        server.count("unparsed")
+                        match = dict(match, radiant_gold_adv=None)
+                    return self.send_json(match)
+                self.send_json({"error": "not found"}, 404)
+
+        return Handler
+
+
+def build_stand_in_server(args, port=0):
+    data = StandInData(seed=args.seed, replay_dir=args.replay_dir, payload_kb=args.payload_kb)
+    return StandInServer(data, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                         throttle_ratio=args.throttle_ratio, retry_after=args.retry_after,
+                         unparsed_ratio=args.unparsed_ratio, parse_delay=args.parse_delay,
+                         never_parsed_ratio=args.never_parsed_ratio, port=port)
+
+
+# ==============================================================================
+# 单次基准运行 (在独立子进程中执行，保证峰值内存互不影响)
+# ==============================================================================
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                with self.lock:
+                    self.samples.setdefault(stage, []).append(elapsed)
+        return timed
+
+    def record(self, stage, elapsed):
+        with self.lock:
+            self.samples.setdefault(stage, []).append(elapsed)
+
+    def summary(self):
+        result = {}
+        for stage, samples in self.samples.items():
+            values = np.asarray(samples) * 1000
+            result[stage] = {"count": len(values), "total_ms": round(float(values.sum()), 2),
+                             "p50_ms": round(float(np.percentile(values, 50)), 3),
+                             "p99_ms": round(float(np.percentile(values, 99)), 3)}
+        return result
+
+
+def get_peak_rss_mb():
+    # resource 只存在于 Unix；Windows 上改用可选依赖 psutil 的峰值工作集，两者都不可用时返回 None
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        memory = psutil.Process().memory_info()
+        return round(getattr(memory, 'peak_wset', memory.rss) / (1024 * 1024), 1)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位为 KB，macOS 上为字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_single_benchmark(base_url, size, threshold, plots, use_cache, decoder=None):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import dota_analyzer_interactive as analyzer
+
+    analyzer.BASE_URL = base_url
+    analyzer.PARSE_POLL_INITIAL_DELAY_SECONDS = BENCHMARK_PARSE_POLL_DELAY_SECONDS
+    analyzer.PARSE_WAIT_DEADLINE_SECONDS = BENCHMARK_PARSE_WAIT_DEADLINE_SECONDS
+    analyzer.configure_fetch_engine(mode="concurrent", max_workers=BENCHMARK_MAX_WORKERS,
+                                    per_second=BENCHMARK_RATE_PER_SECOND, per_minute=BENCHMARK_RATE_PER_MINUTE)
+    analyzer.configure_cache(enabled=use_cache)
+    if decoder:
+        analyzer.MATCH_DECODER = decoder
+    timer = StageTimer()
+    # 分析器内部通过模块全局名调用这些函数，替换后即可按阶段计时
+    for stage, name in (("http_request", "send_api_request"), ("fetch_match", "fetch_and_analyze_match"),
+                        ("analyze_row", "analyze_match_for_player")):
+        setattr(analyzer, name, timer.wrap(stage, getattr(analyzer, name)))
+
+    config = {'mode': '2', 'account_id': BENCHMARK_ACCOUNT_ID, 'scan_count': size, 'threshold': threshold,
+              'report': True, 'plots': plots}
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        started = time.perf_counter()
+        checkpoint, advantage_col_name, dataset = analyzer.run_analysis_flow(
+            config, {BENCHMARK_ACCOUNT_ID}, scan_limit=size)
+        analysis_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        analyzer.generate_report_and_plots(checkpoint, advantage_col_name, config, dataset)
+        analyzer.wait_for_charts()
+        report_seconds = time.perf_counter() - started
+    timer.record("analysis_flow", analysis_seconds)
+    timer.record("report", report_seconds)
+
+    parsed_rows = sum(1 for row in checkpoint.iter_rows() if row.get('Analysis_Status') == "成功")
+    return {"size": size, "decoder": analyzer.get_match_decoder(), "rows": checkpoint.row_count, "parsed_rows": parsed_rows,
+            "analysis_seconds": round(analysis_seconds, 3), "report_seconds": round(report_seconds, 3),
+            "matches_per_sec": round(parsed_rows / analysis_seconds, 2) if analysis_seconds else 0.0,
+            "peak_rss_mb": get_peak_rss_mb(), "stages": timer.summary(),
+            "retries": analyzer.get_metrics().counter_value("dota_http_retries_total"),
+            "rate_limit_sleep_seconds": round(analyzer.get_metrics().counter_value("dota_rate_limit_sleep_seconds_total"), 3),
+            "metrics": analyzer.get_metrics().summary()}
+
+
+# ==============================================================================
+# 基准测试编排、结果输出与回退检测
+# ==============================================================================
+def run_benchmarks(args):
+    server = build_stand_in_server(args).start()
+    print(f"--- 替身服务器已启动: {server.base_url} (延迟 {args.latency_ms}ms ±{args.jitter_ms}ms，"
+          f"429 比例 {args.throttle_ratio:.0%}，延迟解析 {args.unparsed_ratio:.0%}，永不解析 {args.never_parsed_ratio:.0%}) ---")
+    results = []
+    try:
+        for size in args.sizes:
+            # 每个规模在全新的临时目录和独立进程中运行，避免缓存/检查点/峰值内存相互影响
+            work_directory = tempfile.mkdtemp(prefix=f"dota_bench_{size}_")
+            command = [sys.executable, os.path.abspath(__file__), "single", "--base-url", server.base_url,
+                       "--size", str(size), "--threshold", str(args.threshold)]
+            if args.plots:
+                command.append("--plots")
+            if args.cache:
+                command.append("--cache")
+            if args.decoder:
+                command += ["--decoder", args.decoder]
+            print(f"\n正在运行规模 {size} 场比赛的基准测试...")
+            completed = subprocess.run(command, cwd=work_directory, capture_output=True, text=True)
+            if not args.keep:
+                shutil.rmtree(work_directory, ignore_errors=True)
+            lines = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_MARKER)]
+            if completed.returncode != 0 or not lines:
+                print(f"[ERROR] 规模 {size} 的基准运行失败 (退出码 {completed.returncode})")
+                print(completed.stderr[-2000:])
+                return None
+            result = json.loads(lines[-1][len(RESULT_MARKER):])
+            results.append(result)
+            print_result(result)
+    finally:
+        server.stop()
+    print(f"\n替身服务器请求统计: {json.dumps(server.request_counts, ensure_ascii=False)}")
+    return {"created_at": time.time(), "settings": {key: value for key, value in vars(args).items()
+                                                    if key not in ('command', 'output', 'baseline')},
+            "results": results}
+
+
+def print_result(result):
+    peak_rss = f"{result['peak_rss_mb']} MB" if result['peak_rss_mb'] is not None else "未知"
+    print(f"  规模 {result['size']} ({result.get('decoder')}): 成功分析 {result['parsed_rows']}/{result['rows']} 行，"
+          f"{result['matches_per_sec']:.1f} 场/秒，分析 {result['analysis_seconds']:.2f}s，"
+          f"报告 {result['report_seconds']:.2f}s，峰值内存 {peak_rss}，"
+          f"重试 {result.get('retries', 0):.0f} 次，限流等待 {result.get('rate_limit_sleep_seconds', 0):.2f}s")
+    for stage, stats in result['stages'].items():
+        print(f"    {stage:<14} 次数 {stats['count']:>6}  p50 {stats['p50_ms']:>9.3f} ms  p99 {stats['p99_ms']:>9.3f} ms")
+
+
+def compare_with_baseline(report, baseline_path, tolerance):
+    # 吞吐量下降或报告耗时/峰值内存上升超过容差即视为性能回退
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {result['size']: result for result in json.load(f)['results']}
+    regressions = []
+    for result in report['results']:
+        base = baseline.get(result['size'])
+        if base is None:
+            continue
+        if result['matches_per_sec'] < base['matches_per_sec'] * (1 - tolerance):
+            regressions.append(f"规模 {result['size']}: 吞吐量 {base['matches_per_sec']} -> {result['matches_per_sec']} 场/秒")
+        if result['report_seconds'] > base['report_seconds'] * (1 + tolerance):
+            regressions.append(f"规模 {result['size']}: 报告耗时 {base['report_seconds']} -> {result['report_seconds']} 秒")
+        if (result['peak_rss_mb'] is not None and base.get('peak_rss_mb') is not None
+                and result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance)):
+            regressions.append(f"规模 {result['size']}: 峰值内存 {base['peak_rss_mb']} -> {result['peak_rss_mb']} MB")
+    return regressions
+
+
+def export_cache(cache_path, output_directory):
+    # 把分析器本地缓存中的比赛详情和英雄表导出为替身服务器可回放的 JSON 文件
+    os.makedirs(os.path.join(output_directory, "matches"), exist_ok=True)
+    conn = sqlite3.connect(cache_path)
+    exported = 0
+    try:
+        for key, payload in conn.execute("SELECT key, payload FROM api_cache"):
+            data = json.loads(zlib.decompress(payload))
+            if key == "heroes":
+                path = os.path.join(output_directory, "heroes.json")
+            elif key.startswith("match:") and data and data.get('radiant_gold_adv'):
+                path = os.path.join(output_directory, "matches", f"{key.split(':', 1)[1]}.json")
+            else:
+                continue
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            exported += 1
+    finally:
+        conn.close()
+    print(f"[SUCCESS] 已导出 {exported} 条录制数据至: {os.path.abspath(output_directory)}")
+
+
+def add_server_arguments(parser):
+    parser.add_argument('--seed', type=int, default=0, help="合成数据的随机种子")
+    parser.add_argument('--replay-dir', help="回放录制数据的目录 (见 export-cache)")
+    parser.add_argument('--payload-kb', type=int, default=0, help="每场比赛附加的逐玩家日志总体积 (KB)，模拟完整比赛 JSON")
+    parser.add_argument('--latency-ms', type=float, default=20, help="每个请求注入的延迟 (毫秒)")
+    parser.add_argument('--jitter-ms', type=float, default=5, help="延迟的随机抖动 (毫秒)")
+    parser.add_argument('--throttle-ratio', type=float, default=0.0, help="返回 429 的请求比例")
+    parser.add_argument('--retry-after', type=int, default=1, help="429 应答中的 Retry-After (秒)")
+    parser.add_argument('--unparsed-ratio', type=float, default=0.1, help="提交解析请求后才会解析的比赛比例")
+    parser.add_argument('--parse-delay', type=float, default=0.5, help="延迟解析的比赛在提交请求后多久变为已解析 (秒)")
+    parser.add_argument('--never-parsed-ratio', type=float, default=0.0, help="永远不会解析的比赛比例")
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Dota 2 分析器离线性能基准 (本地 OpenDota 替身服务器)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="按多个数据规模运行基准测试")
+    add_server_arguments(run_parser)
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="要测试的比赛数量")
+    run_parser.add_argument('--threshold', type=int, default=DEFAULT_THRESHOLD, help="经济优势阈值")
+    run_parser.add_argument('--plots', action='store_true', help="报告阶段同时渲染图表")
+    run_parser.add_argument('--cache', action='store_true', help="启用分析器的本地缓存 (默认关闭，测量网络路径)")
+    run_parser.add_argument('--keep', action='store_true', help="保留每个规模的临时工作目录")
+    run_parser.add_argument('--decoder', choices=['auto', 'stream', 'orjson', 'json'], help="比赛详情的解码方式")
+    run_parser.add_argument('--output', help="把结果写入 JSON 文件")
+    run_parser.add_argument('--baseline', help="与之前保存的结果比较")
+    run_parser.add_argument('--tolerance', type=float, default=0.2, help="回退检测的相对容差")
+
+    serve_parser = subparsers.add_parser('serve', help="单独启动替身服务器")
+    add_server_arguments(serve_parser)
+    serve_parser.add_argument('--port', type=int, default=8765)
+
+    export_parser = subparsers.add_parser('export-cache', help="把本地缓存导出为可回放的录制数据")
+    export_parser.add_argument('--cache-path', default=os.path.join("cache", "opendota_cache.sqlite3"))
+    export_parser.add_argument('--out', default="bench_data")
+
+    single_parser = subparsers.add_parser('single')
+    single_parser.add_argument('--base-url', required=True)
+    single_parser.add_argument('--size', type=int, required=True)
+    single_parser.add_argument('--threshold', type=int, default=DEFAULT_THRESHOLD)
+    single_parser.add_argument('--plots', action='store_true')
+    single_parser.add_argument('--cache', action='store_true')
+    single_parser.add_argument('--decoder')
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.command == 'single':
+        result = run_single_benchmark(args.base_url, args.size, args.threshold, args.plots, args.cache,
+                                      args.decoder)
+        print(RESULT_MARKER + json.dumps(result))
+        return 0
+    if args.command == 'export-cache':
+        export_cache(args.cache_path, args.out)
+        return 0
+    if args.command == 'serve':
+        server = build_stand_in_server(args, port=args.port)
+        print(f"替身服务器运行中: {server.base_url} (Ctrl-C 退出)")
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
+        return 0
+
+    report = run_benchmarks(args)
+    if report is None:
+        return 1
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[SUCCESS] 基准结果已保存至: {os.path.abspath(args.output)}")
+    if args.baseline:
+        regressions = compare_with_baseline(report, args.baseline, args.tolerance)
+        if regressions:
+            print("\n[ERROR] 检测到性能回退:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print("\n[INFO] 与基线相比未发现性能回退。")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())